@@ -4,15 +4,54 @@
 # =========================================================
 
 import asyncio
+import base64
+import hashlib
+import heapq
 import logging
 import time
 import json
 import os
+import random
+import sys
+import multiprocessing
+
+from bisect import (
+    bisect_left,
+    bisect_right
+)
+
+from array import array
+
+from concurrent.futures import (
+    ProcessPoolExecutor
+)
+
+from queue import Full
+
+from collections import (
+    OrderedDict,
+    deque,
+    namedtuple
+)
 
 import aiohttp
 import aiosqlite
+import numpy as np
 import threading
 
+from aiohttp import web
+
+# Optional: faster JSON decoding, stdlib otherwise
+try:
+    import orjson
+
+    json_loads = orjson.loads
+
+except ImportError:
+    orjson = None
+
+    json_loads = json.loads
+
 from aiogram import (
     Bot,
     Dispatcher,
@@ -21,6 +60,10 @@ from aiogram import (
 
 from aiogram.enums import ParseMode
 
+from aiogram.exceptions import (
+    TelegramRetryAfter
+)
+
 from aiogram.filters import Command
 
 from aiogram.types import (
@@ -36,36 +79,12 @@ from aiogram.utils.keyboard import (
     InlineKeyboardBuilder
 )
 
-from dexscreener import (
-    DexscreenerClient
+from aiogram.webhook.aiohttp_server import (
+    SimpleRequestHandler,
+    setup_application
 )
-from dotenv import load_dotenv
 
-from flask import Flask
-
-# =========================================================
-# FLASK KEEP ALIVE
-# =========================================================
-
-app = Flask(__name__)
-
-@app.route("/")
-def home():
-    return "BOT RUNNING"
-
-
-def start_flask():
-
-    port = int(
-        os.environ.get("PORT", 10000)
-    )
-
-    app.run(
-        host="0.0.0.0",
-        port=port,
-        threaded = True,
-        use_reloader = False
-    )
+from dotenv import load_dotenv
 
 # =========================================================
 # CONFIG
@@ -82,12 +101,42 @@ ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
 
 DB_FILE = "crypto_scanner.db"
 
+# Web server for health, metrics and the optional
+# Telegram webhook. Polling is used unless
+# WEBHOOK_URL (public https base) is set.
+
+PORT = int(os.getenv("PORT", 10000))
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
 # Scanner Settings
 
 SCAN_INTERVAL = 60
 
 MAX_TOP_RESULTS = 3
 
+# Tokens scoring at least this are alerted as soon
+# as they are fetched instead of after the scan
+
+EARLY_ALERT_SCORE = 100
+
+# Network budget per scan: addresses fetched
+# upstream and batch requests in flight
+
+SCAN_BUDGET = 90
+
+SCAN_CONCURRENCY = 3
+
+# HTTP timeouts (seconds)
+
+HTTP_TIMEOUT = 10
+
+SCAN_TIMEOUT = 45
+
 # Filters
 
 MIN_MARKET_CAP = 10000
@@ -118,12 +167,10 @@ logging.basicConfig(
 # BOT
 # =========================================================
 
-bot = Bot(
-    token=BOT_TOKEN,
-    default=DefaultBotProperties(
-        parse_mode=ParseMode.HTML
-    )
-)
+# created by main() and each delivery process, not
+# on import, so spawned workers stay side effect free
+
+bot = None
 
 dp = Dispatcher()
 
@@ -131,1003 +178,5751 @@ router = Router()
 
 dp.include_router(router)
 
-print("BOT STARTED")
+
+def create_bot():
+
+    global bot
+
+    bot = Bot(
+        token=BOT_TOKEN,
+        default=DefaultBotProperties(
+            parse_mode=ParseMode.HTML
+        )
+    )
+
+    return bot
 
 # =========================================================
-# SIMPLE MEMORY CACHE
+# METRICS
 # =========================================================
 
-token_cache = {}
+# Hot-path timings and counters, rendered in the
+# Prometheus text format on /metrics
 
-CACHE_TTL = 300
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+    0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
 
 
-async def get_cached_token(
-    token_address
-):
+class Histogram:
 
-    cached = token_cache.get(
-        token_address
+    __slots__ = (
+        "name",
+        "help",
+        "bounds",
+        "counts",
+        "total"
     )
 
-    if not cached:
-        return None
+    def __init__(
+        self,
+        name,
+        help,
+        bounds=LATENCY_BUCKETS
+    ):
 
-    data = cached["data"]
+        self.name = name
 
-    timestamp = cached["timestamp"]
+        self.help = help
 
-    now = time.time()
+        self.bounds = bounds
 
-    if now - timestamp > CACHE_TTL:
+        self.counts = [0] * (len(bounds) + 1)
 
-        del token_cache[token_address]
+        self.total = 0.0
 
-        return None
+    def observe(self, seconds):
 
-    return data
+        self.counts[
+            bisect_left(self.bounds, seconds)
+        ] += 1
 
+        self.total += seconds
 
-async def cache_token(
-    token_address,
-    data
-):
+    def take(self):
 
-    token_cache[token_address] = {
-        "data": data,
-        "timestamp": time.time()
-    }
+        # observations since the last take
+        state = (self.counts, self.total)
 
-# =========================================================
-# DATABASE
-# =========================================================
+        self.counts = [0] * len(self.counts)
 
-async def init_db():
+        self.total = 0.0
 
-    async with aiosqlite.connect(
-        DB_FILE
-    ) as db:
-
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            chat_id INTEGER PRIMARY KEY,
-            min_market_cap INTEGER DEFAULT 10000,
-            max_market_cap INTEGER DEFAULT 2000000,
-            min_liquidity INTEGER DEFAULT 5000,
-            alerts_enabled INTEGER DEFAULT 1
-        )
-        """)
-
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS tracked_tokens (
-            chat_id INTEGER,
-            token_address TEXT,
-            PRIMARY KEY (
-                chat_id,
-                token_address
-            )
-        )
-        """)
+        return state
 
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS sent_alerts (
-            token_address TEXT PRIMARY KEY,
-            timestamp INTEGER
-        )
-        """)
+    def merge(self, state):
 
-        await db.commit()
+        counts, total = state
 
-# =========================================================
-# DATABASE HELPERS
-# =========================================================
+        for i, n in enumerate(counts):
+            self.counts[i] += n
 
-async def add_user(chat_id):
+        self.total += total
 
-    async with aiosqlite.connect(
-        DB_FILE
-    ) as db:
+    def render(self):
 
-        await db.execute(
-            """
-            INSERT OR IGNORE
-            INTO users (chat_id)
-            VALUES (?)
-            """,
-            (chat_id,)
-        )
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram"
+        ]
 
-        await db.commit()
+        cumulative = 0
 
+        for bound, n in zip(
+            self.bounds + ("+Inf",),
+            list(self.counts)
+        ):
 
-async def is_registered(chat_id):
+            cumulative += n
 
-    async with aiosqlite.connect(
-        DB_FILE
-    ) as db:
+            lines.append(
+                f'{self.name}_bucket{{le="{bound}"}} '
+                f"{cumulative}"
+            )
 
-        async with db.execute(
-            """
-            SELECT chat_id
-            FROM users
-            WHERE chat_id = ?
-            """,
-            (chat_id,)
-        ) as cursor:
+        lines.append(
+            f"{self.name}_sum {self.total}"
+        )
 
-            row = await cursor.fetchone()
+        lines.append(
+            f"{self.name}_count {cumulative}"
+        )
 
-    return row is not None
+        return lines
 
 
-async def get_users():
+class Counter:
 
-    async with aiosqlite.connect(
-        DB_FILE
-    ) as db:
+    __slots__ = (
+        "name",
+        "help",
+        "label",
+        "values"
+    )
 
-        async with db.execute(
-            """
-            SELECT chat_id
-            FROM users
-            WHERE alerts_enabled = 1
-            """
-        ) as cursor:
+    def __init__(
+        self,
+        name,
+        help,
+        label
+    ):
 
-            rows = await cursor.fetchall()
+        self.name = name
 
-    return [r[0] for r in rows]
+        self.help = help
 
+        self.label = label
 
-async def track_token(
-    chat_id,
-    token
-):
+        self.values = {}
 
-    async with aiosqlite.connect(
-        DB_FILE
-    ) as db:
+    def inc(self, value, n=1):
 
-        await db.execute(
-            """
-            INSERT OR IGNORE
-            INTO tracked_tokens
-            (
-                chat_id,
-                token_address
-            )
-            VALUES (?, ?)
-            """,
-            (
-                chat_id,
-                token
-            )
+        self.values[value] = (
+            self.values.get(value, 0) + n
         )
 
-        await db.commit()
+    def take(self):
 
+        values = self.values
 
-async def get_watchlist(chat_id):
+        self.values = {}
 
-    async with aiosqlite.connect(
-        DB_FILE
-    ) as db:
+        return values
 
-        async with db.execute(
-            """
-            SELECT token_address
-            FROM tracked_tokens
-            WHERE chat_id = ?
-            """,
-            (chat_id,)
-        ) as cursor:
+    def merge(self, values):
 
-            rows = await cursor.fetchall()
+        for value, n in values.items():
+            self.inc(value, n)
 
-    return [r[0] for r in rows]
+    def render(self):
 
-# =========================================================
-# HELPERS
-# =========================================================
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter"
+        ]
 
-def safe_float(
-    value,
-    default=0.0
-):
+        for value, n in list(
+            self.values.items()
+        ):
 
-    try:
-        return float(value)
+            lines.append(
+                f'{self.name}{{{self.label}="{value}"}} '
+                f"{n}"
+            )
 
-    except Exception:
-        return default
+        return lines
 
 
-def token_age_minutes(timestamp):
+scan_duration = Histogram(
+    "sniper_scan_duration_seconds",
+    "Duration of a full discovery scan"
+)
 
-    if not timestamp:
-        return 99999
+fetch_latency = Histogram(
+    "sniper_fetch_latency_seconds",
+    "Latency of a single Dexscreener request"
+)
 
-    now = int(time.time())
+analyze_time = Histogram(
+    "sniper_analyze_seconds",
+    "Time spent scoring one fetched batch of pairs"
+)
 
-    ts = int(timestamp)
+send_latency = Histogram(
+    "sniper_send_latency_seconds",
+    "Latency of a Telegram send_message call"
+)
 
-    if ts > 1e10:
-        ts //= 1000
+filter_rejects = Counter(
+    "sniper_filter_rejects_total",
+    "Tokens rejected by the filters",
+    "reason"
+)
 
-    return max(
-        0,
-        (now - ts) // 60
-    )
+fetch_errors = Counter(
+    "sniper_fetch_errors_total",
+    "Dexscreener requests that raised",
+    "error"
+)
+
+send_errors = Counter(
+    "sniper_send_errors_total",
+    "Telegram sends that failed",
+    "error"
+)
+
+# refreshed each scan
+user_count = 0
 
 # =========================================================
-# ANALYTICS ENGINE
+# HTTP CLIENT
 # =========================================================
 
-previous_scores = {}
+# One pooled session for the lifetime of the app so
+# scans reuse warm keep-alive connections
 
-def analyze_token(data):
+http_session = None
 
-    try:
 
-        if isinstance(data, list):
+async def open_http_session():
 
-            if not data:
-                return None
+    global http_session
 
-            data = data[0]
+    connector = aiohttp.TCPConnector(
+        limit=50,
+        limit_per_host=10,
+        ttl_dns_cache=600,
+        keepalive_timeout=120
+    )
 
-        name = (
-            data.get(
-                "baseToken",
-                {}
-            )
-            .get("name", "")
+    http_session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(
+            total=HTTP_TIMEOUT
         )
+    )
 
-        symbol = (
-            data.get(
-                "baseToken",
-                {}
-            )
-            .get("symbol", "")
-        )
 
-        market_cap = safe_float(
-            data.get("marketCap")
-        )
+async def close_http_session():
 
-        liquidity = safe_float(
-            data.get(
-                "liquidity",
-                {}
-            ).get("usd")
-        )
+    global http_session
 
-        volume = safe_float(
-            data.get(
-                "volume",
-                {}
-            ).get("h24")
-        )
+    if http_session is None:
+        return
 
-        price_change = safe_float(
-            data.get(
-                "priceChange",
-                {}
-            ).get("h24")
-        )
+    await http_session.close()
 
-        buys = safe_float(
-            data.get(
-                "txns",
-                {}
-            )
-            .get("h24", {})
-            .get("buys")
-        )
+    http_session = None
 
-        sells = safe_float(
-            data.get(
-                "txns",
-                {}
-            )
-            .get("h24", {})
-            .get("sells")
-        )
+# =========================================================
+# MEMORY CACHE
+# =========================================================
 
-        age = token_age_minutes(
-            data.get("pairCreatedAt")
-        )
+class CacheEntry:
 
-        url = data.get(
-            "url",
-            ""
-        )
-        #print(f"Age is {age}")
+    __slots__ = (
+        "value",
+        "expires"
+    )
 
-        # =================================================
-        # FILTERS
-        # =================================================
+    def __init__(
+        self,
+        value,
+        expires
+    ):
 
-        if not (
-            MIN_MARKET_CAP
-            <= market_cap
-            <= MAX_MARKET_CAP
-        ):
-            return None
+        self.value = value
 
-        if volume < MIN_VOLUME:
-            return None
+        self.expires = expires
 
-        if liquidity < MIN_LIQUIDITY:
-            return None
 
-        if not (
-            MIN_AGE_MINUTES
-            <= age
-            <= MAX_AGE_MINUTES
-        ):
-            return None
+class TTLCache:
 
-        # =================================================
-        # ANALYTICS
-        # =================================================
+    # Bounded LRU map with per-entry expiry
 
-        buy_pressure = (
-            buys / (sells + 1)
-        )
+    def __init__(
+        self,
+        maxsize,
+        ttl
+    ):
 
-        liquidity_health = (
-            liquidity /
-            (market_cap + 1)
-        )
+        self.maxsize = maxsize
 
-        activity_ratio = (
-            volume /
-            (market_cap + 1)
-        )
+        self.ttl = ttl
 
-        velocity_score = (
-            activity_ratio * 100
-        )
+        self.entries = OrderedDict()
 
-        rug_risk = 0
+        self.hits = 0
 
-        if liquidity_health < 0.05:
-            rug_risk += 35
+        self.misses = 0
 
-        if buy_pressure < 0.5:
-            rug_risk += 25
+        self.evictions = 0
 
-        if liquidity < 5000:
-            rug_risk += 25
+        self.expirations = 0
 
-        if age < 2:
-            rug_risk += 15
+    def __len__(self):
 
-        ai_score = (
-            (
-                price_change * 0.35
-            )
-            +
-            (
-                velocity_score * 0.30
-            )
-            +
-            (
-                buy_pressure * 15 * 0.20
-            )
-            +
-            (
-                liquidity_health
-                * 100
-                * 0.15
-            )
-        )
+        return len(self.entries)
 
-        return {
-            "name": name,
-            "symbol": symbol,
-            "market_cap": market_cap,
-            "liquidity": liquidity,
-            "volume": volume,
-            "price_change": price_change,
-            "buy_pressure": buy_pressure,
-            "velocity_score": velocity_score,
-            "rug_risk": rug_risk,
-            "ai_score": ai_score,
-            "age": age,
-            "url": url
-        }
+    def get(
+        self,
+        key,
+        default=None
+    ):
 
-    except Exception as e:
+        entry = self.entries.get(key)
 
-        logging.warning(
-            f"Analytics error: {e}"
-        )
+        if entry is None:
 
-        return None
+            self.misses += 1
 
-# =========================================================
-# ALERT FORMATTER
-# =========================================================
+            return default
 
-def format_alert(token):
+        if time.time() > entry.expires:
 
-    risk = "LOW"
+            del self.entries[key]
 
-    if token["rug_risk"] > 50:
-        risk = "HIGH"
+            self.expirations += 1
 
-    elif token["rug_risk"] > 25:
-        risk = "MEDIUM"
+            self.misses += 1
 
-    emoji = "🔥"
+            return default
 
-    return (
-        f"{emoji} "
-        f"{token['name']} "
-        f"({token['symbol']})\n\n"
+        self.entries.move_to_end(key)
 
-        f"💰 MC: "
-        f"${token['market_cap']:,.0f}\n"
+        self.hits += 1
 
-        f"💧 Liquidity: "
-        f"${token['liquidity']:,.0f}\n"
+        return entry.value
 
-        f"📊 Volume: "
-        f"${token['volume']:,.0f}\n"
+    def set(
+        self,
+        key,
+        value,
+        ttl=None
+    ):
 
-        f"📈 Change: "
-        f"{token['price_change']:.2f}%\n"
+        if ttl is None:
+            ttl = self.ttl
 
-        f"⚡ AI Score: "
-        f"{token['ai_score']:.2f}\n"
+        self.entries[key] = CacheEntry(
+            value,
+            time.time() + ttl
+        )
 
-        f"🚀 Velocity: "
-        f"{token['velocity_score']:.2f}\n"
+        self.entries.move_to_end(key)
 
-        f"🧠 Buy Pressure: "
-        f"{token['buy_pressure']:.2f}\n"
+        while len(self.entries) > self.maxsize:
 
-        f"⚠ Rug Risk: "
-        f"{risk}\n"
+            self.entries.popitem(last=False)
 
-        f"⏱ Age: "
-        f"{token['age']} mins\n\n"
+            self.evictions += 1
 
-        f"🔗 {token['url']}"
-    )
+    def sweep(self):
 
-# =========================================================
-# DUPLICATE ALERT PREVENTION
-# =========================================================
+        now = time.time()
 
-sent_alerts = set()
+        expired = [
+            key
+            for key, entry in self.entries.items()
+            if now > entry.expires
+        ]
 
-def should_send_alert(address):
+        for key in expired:
+            del self.entries[key]
 
-    if address in sent_alerts:
-        return False
+        self.expirations += len(expired)
 
-    sent_alerts.add(address)
+        return len(expired)
 
-    return True
+    def stats(self):
 
-# =========================================================
-# KEYBOARDS
-# =========================================================
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
 
-def main_menu():
 
-    kb = InlineKeyboardBuilder()
+CACHE_TTL = 300
 
-    kb.button(
-        text="📊 Scanner",
-        callback_data="scanner"
-    )
+token_cache = TTLCache(
+    maxsize=5000,
+    ttl=CACHE_TTL
+)
 
-    kb.button(
-        text="⭐ Watchlist",
-        callback_data="watchlist"
-    )
 
-    kb.button(
-        text="🔥 Trending",
-        callback_data="trending"
+async def get_cached_token(
+    token_address
+):
+
+    return token_cache.get(
+        token_address
     )
 
-    kb.button(
-        text="⚙ Settings",
-        callback_data="settings"
+
+async def cache_token(
+    token_address,
+    data
+):
+
+    token_cache.set(
+        token_address,
+        data
     )
 
-    kb.button(
-        text="🆔 My ID",
-        callback_data="myid"
+# Raw pair payloads, kept briefly so a token can be
+# re-analyzed without another round trip
+
+RAW_CACHE_TTL = 60
+
+raw_cache = TTLCache(
+    maxsize=2000,
+    ttl=RAW_CACHE_TTL
+)
+
+
+async def get_cached_pairs(
+    token_address
+):
+
+    return raw_cache.get(
+        token_address
     )
 
-    kb.button(
-        text="📡 Status",
-        callback_data="status"
+
+async def cache_pairs(
+    token_address,
+    data
+):
+
+    raw_cache.set(
+        token_address,
+        data
     )
 
-    kb.adjust(2)
+# Filtered out verdicts: token address -> reject reason
+# (a None ttl means the token can never pass again)
 
-    return kb.as_markup()
+REJECT_TTL = 300
 
+NO_PAIRS_TTL = 60
 
-def token_keyboard(address):
+reject_cache = TTLCache(
+    maxsize=20000,
+    ttl=REJECT_TTL
+)
 
-    kb = InlineKeyboardBuilder()
 
-    kb.button(
-        text="⭐ Track",
-        callback_data=f"track:{address}"
+def reject_ttl(
+    reason,
+    age
+):
+
+    if reason == "too_old" and age < 99999:
+        return None
+
+    if reason == "too_young":
+
+        # expire when the token is old enough
+        return max(
+            NO_PAIRS_TTL,
+            (MIN_AGE_MINUTES - age) * 60
+        )
+
+    if reason in ("no_pairs", "error"):
+        return NO_PAIRS_TTL
+
+    return REJECT_TTL
+
+
+async def is_rejected(
+    token_address
+):
+
+    return (
+        reject_cache.get(token_address)
+        is not None
     )
 
-    kb.button(
-        text="❌ Ignore",
-        callback_data="ignore"
+
+async def cache_reject(
+    token_address,
+    reason,
+    age
+):
+
+    ttl = reject_ttl(
+        reason,
+        age
     )
 
-    kb.adjust(2)
+    filter_rejects.inc(reason)
 
-    return kb.as_markup()
+    reject_cache.set(
+        token_address,
+        reason,
+        float("inf") if ttl is None else ttl
+    )
+
+# Expired entries are dropped on lookup and by a
+# periodic sweep for keys that are never read again
+
+CACHE_SWEEP_INTERVAL = 60
+
+
+async def cache_sweeper():
+
+    while True:
+
+        await asyncio.sleep(
+            CACHE_SWEEP_INTERVAL
+        )
+
+        for cache in (
+            token_cache,
+            raw_cache,
+            reject_cache
+        ):
+            cache.sweep()
 
 # =========================================================
-# COMMANDS
+# DATABASE
 # =========================================================
 
-@router.message(Command("start"))
-async def start_handler(
-    message: Message
-):
+# One connection for the lifetime of the app. Writes go
+# through a single writer task that commits in groups.
 
-    await message.answer(
-        (
-            "🔥 Welcome to "
-            "AI Crypto Scanner Bot\n\n"
+db = None
 
-            "Real-time Solana "
-            "token intelligence."
-        ),
-        reply_markup=main_menu()
+db_queue = asyncio.Queue()
+
+db_writer_task = None
+
+
+async def init_db():
+
+    global db, db_writer_task
+
+    db = await aiosqlite.connect(
+        DB_FILE,
+        cached_statements=64
     )
 
+    await db.execute(
+        "PRAGMA journal_mode=WAL"
+    )
 
-@router.message(Command("help"))
-async def help_handler(
-    message: Message
-):
+    await db.execute(
+        "PRAGMA synchronous=NORMAL"
+    )
 
-    await message.answer(
-        "Choose an option below:",
-        reply_markup=main_menu()
+    await db.execute(
+        "PRAGMA cache_size=-16000"
     )
 
-'''
-@router.message(Command("myid"))
-async def myid_handler(
-    message: Message
+    await db.execute(
+        "PRAGMA mmap_size=67108864"
+    )
+
+    await db.execute(
+        "PRAGMA temp_store=MEMORY"
+    )
+
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        chat_id INTEGER PRIMARY KEY,
+        min_market_cap INTEGER DEFAULT 10000,
+        max_market_cap INTEGER DEFAULT 2000000,
+        min_liquidity INTEGER DEFAULT 5000,
+        alerts_enabled INTEGER DEFAULT 1
+    )
+    """)
+
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS tracked_tokens (
+        chat_id INTEGER,
+        token_address TEXT,
+        PRIMARY KEY (
+            chat_id,
+            token_address
+        )
+    )
+    """)
+
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS sent_alerts (
+        token_address TEXT PRIMARY KEY,
+        timestamp INTEGER
+    )
+    """)
+
+    await db.commit()
+
+    db_writer_task = asyncio.create_task(
+        db_writer()
+    )
+
+
+async def close_db():
+
+    global db, db_writer_task
+
+    if db is None:
+        return
+
+    await db_queue.join()
+
+    db_writer_task.cancel()
+
+    await asyncio.gather(
+        db_writer_task,
+        return_exceptions=True
+    )
+
+    await db.close()
+
+    db = None
+
+    db_writer_task = None
+
+
+async def db_writer():
+
+    while True:
+
+        batch = [await db_queue.get()]
+
+        while not db_queue.empty():
+            batch.append(
+                db_queue.get_nowait()
+            )
+
+        done = []
+
+        for sql, params, future in batch:
+
+            try:
+
+                await db.execute(
+                    sql,
+                    params
+                )
+
+                done.append(future)
+
+            except Exception as e:
+
+                if not future.done():
+                    future.set_exception(e)
+
+        try:
+
+            await db.commit()
+
+            for future in done:
+
+                if not future.done():
+                    future.set_result(None)
+
+        except Exception as e:
+
+            for future in done:
+
+                if not future.done():
+                    future.set_exception(e)
+
+        for _ in batch:
+            db_queue.task_done()
+
+
+async def db_write(
+    sql,
+    params=()
 ):
 
-    await message.answer(
-        f"🆔 {message.chat.id}"
+    future = (
+        asyncio.get_running_loop()
+        .create_future()
     )
 
+    db_queue.put_nowait(
+        (
+            sql,
+            params,
+            future
+        )
+    )
 
-@router.message(Command("status"))
-async def status_handler(
-    message: Message
+    await future
+
+
+async def db_fetchall(
+    sql,
+    params=()
 ):
 
-    registered = await is_registered(
-        message.chat.id
+    async with db.execute(
+        sql,
+        params
+    ) as cursor:
+
+        return await cursor.fetchall()
+
+# =========================================================
+# DATABASE HELPERS
+# =========================================================
+
+ADD_USER_SQL = """
+INSERT OR IGNORE
+INTO users (chat_id)
+VALUES (?)
+"""
+
+IS_REGISTERED_SQL = """
+SELECT chat_id
+FROM users
+WHERE chat_id = ?
+"""
+
+GET_USERS_SQL = """
+SELECT
+    chat_id,
+    min_market_cap,
+    max_market_cap,
+    min_liquidity
+FROM users
+WHERE alerts_enabled = 1
+"""
+
+TRACK_TOKEN_SQL = """
+INSERT OR IGNORE
+INTO tracked_tokens
+(
+    chat_id,
+    token_address
+)
+VALUES (?, ?)
+"""
+
+GET_TRACKED_SQL = """
+SELECT chat_id, token_address
+FROM tracked_tokens
+"""
+
+GET_WATCHLIST_SQL = """
+SELECT token_address
+FROM tracked_tokens
+WHERE chat_id = ?
+"""
+
+
+async def add_user(chat_id):
+
+    await db_write(
+        ADD_USER_SQL,
+        (chat_id,)
     )
 
-    if registered:
 
-        await message.answer(
-            "✅ Approved"
-        )
+async def is_registered(chat_id):
 
-    else:
+    rows = await db_fetchall(
+        IS_REGISTERED_SQL,
+        (chat_id,)
+    )
 
-        await message.answer(
+    return bool(rows)
+
+
+UserFilter = namedtuple(
+    "UserFilter",
+    (
+        "chat_id",
+        "min_market_cap",
+        "max_market_cap",
+        "min_liquidity"
+    )
+)
+
+
+async def get_users():
+
+    rows = await db_fetchall(
+        GET_USERS_SQL
+    )
+
+    # NULL thresholds mean no limit
+    return [
+        UserFilter(
+            chat_id,
+            min_mc or 0,
             (
-                "❌ Not approved.\n\n"
-                f"Send ID to "
-                f"{ADMIN_USERNAME}"
-            )
+                float("inf")
+                if max_mc is None
+                else max_mc
+            ),
+            min_liq or 0
+        )
+        for (
+            chat_id,
+            min_mc,
+            max_mc,
+            min_liq
+        ) in rows
+    ]
+
+
+async def track_token(
+    chat_id,
+    token
+):
+
+    await db_write(
+        TRACK_TOKEN_SQL,
+        (
+            chat_id,
+            token
         )
+    )
+
+    trackers.setdefault(
+        token,
+        set()
+    ).add(chat_id)
+
+
+# token address -> chat ids tracking it
+
+trackers = {}
+
+
+async def load_trackers():
+
+    rows = await db_fetchall(
+        GET_TRACKED_SQL
+    )
+
+    trackers.clear()
+
+    for chat_id, token in rows:
+
+        trackers.setdefault(
+            token,
+            set()
+        ).add(chat_id)
+
+
+async def get_watchlist(chat_id):
+
+    rows = await db_fetchall(
+        GET_WATCHLIST_SQL,
+        (chat_id,)
+    )
+
+    return [r[0] for r in rows]
+
+# =========================================================
+# HELPERS
+# =========================================================
+
+def safe_float(
+    value,
+    default=0.0
+):
+
+    try:
+        return float(value)
+
+    except Exception:
+        return default
+
+
+def token_age_minutes(timestamp):
+
+    if not timestamp:
+        return 99999
+
+    now = int(time.time())
+
+    ts = int(timestamp)
+
+    if ts > 1e10:
+        ts //= 1000
+
+    return max(
+        0,
+        (now - ts) // 60
+    )
+
+
+def chunked(
+    items,
+    size
+):
+
+    for i in range(
+        0,
+        len(items),
+        size
+    ):
+        yield items[i:i + size]
+
+# =========================================================
+# PAIR DECODING
+# =========================================================
+
+# Responses are decoded with json_loads (orjson when
+# installed) and each pair is cut down to the fields
+# the analytics read, so the nested dicts can be freed
+# right after the response is parsed.
+
+Pair = namedtuple(
+    "Pair",
+    (
+        "address",
+        "name",
+        "symbol",
+        "url",
+        "market_cap",
+        "liquidity",
+        "volume",
+        "price_change",
+        "buys",
+        "sells",
+        "created_at"
+    )
+)
+
+
+def decode_pair(data):
+
+    base = data.get("baseToken") or {}
+
+    txns = (
+        (data.get("txns") or {})
+        .get("h24")
+        or {}
+    )
+
+    return Pair(
+        base.get("address"),
+        base.get("name", ""),
+        base.get("symbol", ""),
+        data.get("url", ""),
+        safe_float(
+            data.get("marketCap")
+        ),
+        safe_float(
+            (data.get("liquidity") or {})
+            .get("usd")
+        ),
+        safe_float(
+            (data.get("volume") or {})
+            .get("h24")
+        ),
+        safe_float(
+            (data.get("priceChange") or {})
+            .get("h24")
+        ),
+        safe_float(
+            txns.get("buys")
+        ),
+        safe_float(
+            txns.get("sells")
+        ),
+        data.get("pairCreatedAt")
+    )
+
+
+def group_pairs(data):
+
+    # list of pair dicts -> {address: [Pair]}
+
+    pairs_by_token = {}
+
+    for item in data or []:
+
+        try:
+            pair = decode_pair(item)
+
+        except (AttributeError, TypeError):
+            continue
+
+        if not pair.address:
+            continue
+
+        pairs_by_token.setdefault(
+            pair.address,
+            []
+        ).append(pair)
+
+    return pairs_by_token
+
+
+def decode_pairs(body):
+
+    return group_pairs(
+        json_loads(body)
+    )
+
+# =========================================================
+# ANALYTICS ENGINE
+# =========================================================
+
+# One scored token. A namedtuple keeps the per-token
+# footprint small across caches, history and ranking.
+
+TokenSnapshot = namedtuple(
+    "TokenSnapshot",
+    (
+        "address",
+        "name",
+        "symbol",
+        "market_cap",
+        "liquidity",
+        "volume",
+        "price_change",
+        "buys",
+        "sells",
+        "buy_pressure",
+        "velocity_score",
+        "rug_risk",
+        "ai_score",
+        "age",
+        "url"
+    )
+)
+
+# Market cap and liquidity gate analysis at the
+# loosest limits across users with alerts on, so
+# UserMatcher can apply each user's own. The constants
+# apply while there are no users.
+
+FilterBounds = namedtuple(
+    "FilterBounds",
+    (
+        "min_market_cap",
+        "max_market_cap",
+        "min_liquidity"
+    )
+)
+
+DEFAULT_FILTER_BOUNDS = FilterBounds(
+    MIN_MARKET_CAP,
+    MAX_MARKET_CAP,
+    MIN_LIQUIDITY
+)
+
+filter_bounds = DEFAULT_FILTER_BOUNDS
+
+
+def set_filter_bounds(users):
+
+    global filter_bounds
+
+    if not users:
+
+        filter_bounds = DEFAULT_FILTER_BOUNDS
+
+        return
+
+    filter_bounds = FilterBounds(
+        min(u.min_market_cap for u in users),
+        max(u.max_market_cap for u in users),
+        min(u.min_liquidity for u in users)
+    )
+
+
+def analyze_token(data):
+
+    return evaluate_token(data)[0]
+
+
+def measure_token(data):
+
+    # analytics for any token, ignoring the filters
+
+    return evaluate_token(
+        data,
+        filters=False
+    )[0]
+
+
+def evaluate_token(
+    data,
+    filters=True,
+    bounds=None
+):
+
+    # returns (analyzed, reject_reason, age)
+
+    bounds = bounds or filter_bounds
+
+    age = 0
+
+    try:
+
+        if isinstance(data, list):
+
+            if not data:
+                return None, "no_pairs", age
+
+            data = data[0]
+
+        name = data.name
+
+        symbol = data.symbol
+
+        market_cap = data.market_cap
+
+        liquidity = data.liquidity
+
+        volume = data.volume
+
+        price_change = data.price_change
+
+        buys = data.buys
+
+        sells = data.sells
+
+        age = token_age_minutes(
+            data.created_at
+        )
+
+        url = data.url
+        #print(f"Age is {age}")
+
+        # =================================================
+        # FILTERS
+        # =================================================
+
+        if filters:
+
+            if not (
+                bounds.min_market_cap
+                <= market_cap
+                <= bounds.max_market_cap
+            ):
+                return None, "market_cap", age
+
+            if volume < MIN_VOLUME:
+                return None, "volume", age
+
+            if liquidity < bounds.min_liquidity:
+                return None, "liquidity", age
+
+            if age < MIN_AGE_MINUTES:
+                return None, "too_young", age
+
+            if age > MAX_AGE_MINUTES:
+                return None, "too_old", age
+
+        # =================================================
+        # ANALYTICS
+        # =================================================
+
+        buy_pressure = (
+            buys / (sells + 1)
+        )
+
+        liquidity_health = (
+            liquidity /
+            (market_cap + 1)
+        )
+
+        activity_ratio = (
+            volume /
+            (market_cap + 1)
+        )
+
+        velocity_score = (
+            activity_ratio * 100
+        )
+
+        rug_risk = 0
+
+        if liquidity_health < 0.05:
+            rug_risk += 35
+
+        if buy_pressure < 0.5:
+            rug_risk += 25
+
+        if liquidity < 5000:
+            rug_risk += 25
+
+        if age < 2:
+            rug_risk += 15
+
+        ai_score = (
+            (
+                price_change * 0.35
+            )
+            +
+            (
+                velocity_score * 0.30
+            )
+            +
+            (
+                buy_pressure * 15 * 0.20
+            )
+            +
+            (
+                liquidity_health
+                * 100
+                * 0.15
+            )
+        )
+
+        return TokenSnapshot(
+            data.address,
+            name,
+            symbol,
+            market_cap,
+            liquidity,
+            volume,
+            price_change,
+            buys,
+            sells,
+            buy_pressure,
+            velocity_score,
+            rug_risk,
+            ai_score,
+            age,
+            url
+        ), None, age
+
+    except Exception as e:
+
+        logging.warning(
+            f"Analytics error: {e}"
+        )
+
+        return None, "error", age
+
+# =========================================================
+# BATCH ANALYTICS
+# =========================================================
+
+# Same filters and scores as evaluate_token, computed
+# column-wise over a whole batch of decoded pairs
+
+REJECT_REASONS = (
+    "market_cap",
+    "volume",
+    "liquidity",
+    "too_young",
+    "too_old"
+)
+
+
+def evaluate_batch(
+    items,
+    bounds=None
+):
+
+    bounds = bounds or filter_bounds
+
+    results = [None] * len(items)
+
+    rows = []
+
+    values = []
+
+    ages = []
+
+    for i, data in enumerate(items):
+
+        try:
+
+            if isinstance(data, list):
+
+                if not data:
+
+                    results[i] = (
+                        None,
+                        "no_pairs",
+                        0
+                    )
+
+                    continue
+
+                data = data[0]
+
+            value = (
+                data.market_cap,
+                data.liquidity,
+                data.volume,
+                data.price_change,
+                data.buys,
+                data.sells
+            )
+
+            age = token_age_minutes(
+                data.created_at
+            )
+
+            row = (
+                i,
+                data.address,
+                data.name,
+                data.symbol,
+                data.url
+            )
+
+        except Exception as e:
+
+            logging.warning(
+                f"Analytics error: {e}"
+            )
+
+            results[i] = (None, "error", 0)
+
+            continue
+
+        rows.append(row)
+
+        values.append(value)
+
+        ages.append(age)
+
+    if not rows:
+        return results
+
+    (
+        market_cap,
+        liquidity,
+        volume,
+        price_change,
+        buys,
+        sells
+    ) = np.array(
+        values,
+        dtype=float
+    ).T
+
+    age = np.array(
+        ages,
+        dtype=float
+    )
+
+    # first failing filter wins, like the scalar path
+    reason = np.select(
+        [
+            ~(
+                (bounds.min_market_cap <= market_cap)
+                & (market_cap <= bounds.max_market_cap)
+            ),
+            volume < MIN_VOLUME,
+            liquidity < bounds.min_liquidity,
+            age < MIN_AGE_MINUTES,
+            age > MAX_AGE_MINUTES
+        ],
+        range(1, len(REJECT_REASONS) + 1),
+        default=0
+    )
+
+    for j in np.flatnonzero(reason).tolist():
+
+        i = rows[j][0]
+
+        results[i] = (
+            None,
+            REJECT_REASONS[reason[j] - 1],
+            ages[j]
+        )
+
+    keep = np.flatnonzero(reason == 0)
+
+    if not len(keep):
+        return results
+
+    market_cap = market_cap[keep]
+
+    liquidity = liquidity[keep]
+
+    sells = sells[keep]
+
+    age = age[keep]
+
+    # inf and nan inputs are allowed through like in
+    # the scalar path, without RuntimeWarnings
+    with np.errstate(
+        divide="ignore",
+        invalid="ignore",
+        over="ignore"
+    ):
+
+        buy_pressure = (
+            buys[keep] / (sells + 1)
+        )
+
+        liquidity_health = (
+            liquidity /
+            (market_cap + 1)
+        )
+
+        velocity_score = (
+            volume[keep] /
+            (market_cap + 1)
+        ) * 100
+
+        rug_risk = (
+            (liquidity_health < 0.05) * 35
+            + (buy_pressure < 0.5) * 25
+            + (liquidity < 5000) * 25
+            + (age < 2) * 15
+        )
+
+        ai_score = (
+            price_change[keep] * 0.35
+            + velocity_score * 0.30
+            + buy_pressure * 15 * 0.20
+            + liquidity_health * 100 * 0.15
+        )
+
+    # the scalar path raises ZeroDivisionError here
+    invalid = (
+        (sells + 1 == 0)
+        | (market_cap + 1 == 0)
+    )
+
+    for (
+        j,
+        bad,
+        mc,
+        liq,
+        vol,
+        change,
+        buy_count,
+        sell_count,
+        pressure,
+        velocity,
+        risk,
+        score
+    ) in zip(
+        keep.tolist(),
+        invalid.tolist(),
+        market_cap.tolist(),
+        liquidity.tolist(),
+        volume[keep].tolist(),
+        price_change[keep].tolist(),
+        buys[keep].tolist(),
+        sells.tolist(),
+        buy_pressure.tolist(),
+        velocity_score.tolist(),
+        rug_risk.tolist(),
+        ai_score.tolist()
+    ):
+
+        i, address, name, symbol, url = rows[j]
+
+        if bad:
+
+            logging.warning(
+                "Analytics error: "
+                "float division by zero"
+            )
+
+            results[i] = (None, "error", ages[j])
+
+            continue
+
+        results[i] = (
+            TokenSnapshot(
+                address,
+                name,
+                symbol,
+                mc,
+                liq,
+                vol,
+                change,
+                buy_count,
+                sell_count,
+                pressure,
+                velocity,
+                risk,
+                score,
+                ages[j],
+                url
+            ),
+            None,
+            ages[j]
+        )
+
+    return results
+
+# =========================================================
+# SCORE HISTORY
+# =========================================================
+
+# Fixed-size ring buffers per token, one slot per scan
+# that analyzed it, so memory per token is constant
+
+HISTORY_SIZE = 32
+
+HISTORY_FIELDS = (
+    "ai_score",
+    "price_change",
+    "liquidity",
+    "volume",
+    "buys",
+    "sells"
+)
+
+SCORE_RISE_DELTA = 25
+
+LIQUIDITY_PULL_DROP = 0.5
+
+MOMENTUM_ALERT_COOLDOWN = 900
+
+
+class TokenHistory:
+
+    __slots__ = (
+        "times",
+        "values",
+        "head",
+        "count",
+        "score_delta",
+        "liquidity_drain",
+        "volume_accel",
+        "volume_rate",
+        "peak_liquidity",
+        "alerted"
+    )
+
+    def __init__(self):
+
+        self.times = array(
+            "d",
+            bytes(8 * HISTORY_SIZE)
+        )
+
+        self.values = array(
+            "d",
+            bytes(
+                8 * HISTORY_SIZE
+                * len(HISTORY_FIELDS)
+            )
+        )
+
+        self.head = 0
+
+        self.count = 0
+
+        self.score_delta = 0.0
+
+        # fraction of liquidity lost per minute
+        self.liquidity_drain = 0.0
+
+        # change in volume per minute, per minute
+        self.volume_accel = 0.0
+
+        self.volume_rate = 0.0
+
+        self.peak_liquidity = 0.0
+
+        self.alerted = 0.0
+
+    def value(
+        self,
+        field,
+        back=0
+    ):
+
+        slot = (
+            self.head - 1 - back
+        ) % HISTORY_SIZE
+
+        return self.values[
+            slot * len(HISTORY_FIELDS)
+            + HISTORY_FIELDS.index(field)
+        ]
+
+    def add(
+        self,
+        token,
+        now
+    ):
+
+        prev_time = self.times[
+            (self.head - 1) % HISTORY_SIZE
+        ]
+
+        has_prev = self.count > 0
+
+        if has_prev:
+
+            prev_score = self.value("ai_score")
+
+            prev_liquidity = self.value(
+                "liquidity"
+            )
+
+            prev_volume = self.value("volume")
+
+        base = self.head * len(HISTORY_FIELDS)
+
+        for i, field in enumerate(
+            HISTORY_FIELDS
+        ):
+            self.values[base + i] = getattr(
+                token,
+                field
+            )
+
+        self.times[self.head] = now
+
+        self.head = (
+            self.head + 1
+        ) % HISTORY_SIZE
+
+        self.count = min(
+            self.count + 1,
+            HISTORY_SIZE
+        )
+
+        liquidity = token.liquidity
+
+        if not has_prev:
+
+            self.peak_liquidity = liquidity
+
+            return
+
+        # update momentum from the newest step only
+
+        minutes = max(
+            (now - prev_time) / 60,
+            1 / 60
+        )
+
+        self.score_delta = (
+            token.ai_score - prev_score
+        )
+
+        self.liquidity_drain = (
+            (prev_liquidity - liquidity)
+            / max(prev_liquidity, 1)
+            / minutes
+        )
+
+        volume_rate = (
+            token.volume - prev_volume
+        ) / minutes
+
+        if self.count > 2:
+
+            self.volume_accel = (
+                volume_rate - self.volume_rate
+            ) / minutes
+
+        self.volume_rate = volume_rate
+
+        self.peak_liquidity = max(
+            self.peak_liquidity,
+            liquidity
+        )
+
+
+previous_scores = TTLCache(
+    maxsize=5000,
+    ttl=3 * 3600
+)
+
+
+def record_history(
+    address,
+    token
+):
+
+    # returns momentum events for this update
+
+    history = previous_scores.get(address)
+
+    if history is None:
+        history = TokenHistory()
+
+    previous_scores.set(
+        address,
+        history
+    )
+
+    now = time.time()
+
+    history.add(token, now)
+
+    if history.count < 2:
+        return []
+
+    if (
+        now - history.alerted
+        < MOMENTUM_ALERT_COOLDOWN
+    ):
+        return []
+
+    events = []
+
+    if history.score_delta >= SCORE_RISE_DELTA:
+        events.append("score_rising")
+
+    if (
+        token.liquidity
+        <= history.peak_liquidity
+        * (1 - LIQUIDITY_PULL_DROP)
+    ):
+        events.append("liquidity_pulled")
+
+    if events:
+        history.alerted = now
+
+    return events
+
+
+def format_momentum(
+    token,
+    event,
+    history
+):
+
+    if event == "liquidity_pulled":
+
+        drop = 1 - (
+            token.liquidity
+            / max(history.peak_liquidity, 1)
+        )
+
+        return (
+            f"🚨 Liquidity pulled: "
+            f"{token.name} "
+            f"({token.symbol})\n\n"
+
+            f"💧 Liquidity: "
+            f"${history.peak_liquidity:,.0f} → "
+            f"${token.liquidity:,.0f} "
+            f"(-{drop:.0%})\n\n"
+
+            f"🔗 {token.url}"
+        )
+
+    return (
+        f"📈 Score rising: "
+        f"{token.name} "
+        f"({token.symbol})\n\n"
+
+        f"⚡ AI Score: "
+        f"{token.ai_score - history.score_delta:.2f} → "
+        f"{token.ai_score:.2f}\n"
+
+        f"📊 Volume accel: "
+        f"{history.volume_accel:,.0f}/min²\n\n"
+
+        f"🔗 {token.url}"
+    )
+
+# =========================================================
+# USER MATCHING
+# =========================================================
+
+# Each threshold column is indexed by its distinct values
+# with a precomputed bitmask of users per bisect slot, so
+# matching a token is three bisects and two int ANDs.
+
+def threshold_index(
+    values,
+    at_least
+):
+
+    thresholds = sorted(set(values))
+
+    groups = dict.fromkeys(
+        thresholds,
+        0
+    )
+
+    for bit, value in enumerate(values):
+        groups[value] |= 1 << bit
+
+    if not at_least:
+        thresholds.reverse()
+
+    masks = [0]
+
+    for value in thresholds:
+        masks.append(
+            masks[-1] | groups[value]
+        )
+
+    if not at_least:
+
+        thresholds.reverse()
+
+        masks.reverse()
+
+    return thresholds, masks
+
+
+class UserMatcher:
+
+    def __init__(self, users):
+
+        self.chat_ids = [
+            u.chat_id
+            for u in users
+        ]
+
+        self.min_market_cap = threshold_index(
+            [u.min_market_cap for u in users],
+            at_least=True
+        )
+
+        self.max_market_cap = threshold_index(
+            [u.max_market_cap for u in users],
+            at_least=False
+        )
+
+        self.min_liquidity = threshold_index(
+            [u.min_liquidity for u in users],
+            at_least=True
+        )
+
+    def match(self, token):
+
+        market_cap = token.market_cap
+
+        thresholds, masks = self.min_market_cap
+
+        mask = masks[
+            bisect_right(
+                thresholds,
+                market_cap
+            )
+        ]
+
+        thresholds, masks = self.max_market_cap
+
+        mask &= masks[
+            bisect_left(
+                thresholds,
+                market_cap
+            )
+        ]
+
+        thresholds, masks = self.min_liquidity
+
+        mask &= masks[
+            bisect_right(
+                thresholds,
+                token.liquidity
+            )
+        ]
+
+        # bit i set -> user i matches
+        bits = bin(mask)[:1:-1]
+
+        matched = []
+
+        i = bits.find("1")
+
+        while i != -1:
+
+            matched.append(
+                self.chat_ids[i]
+            )
+
+            i = bits.find("1", i + 1)
+
+        return matched
+
+# =========================================================
+# ALERT FORMATTER
+# =========================================================
+
+def risk_level(rug_risk):
+
+    if rug_risk > 50:
+        return "HIGH"
+
+    if rug_risk > 25:
+        return "MEDIUM"
+
+    return "LOW"
+
+
+def format_alert(token):
+
+    risk = risk_level(
+        token.rug_risk
+    )
+
+    emoji = "🔥"
+
+    return (
+        f"{emoji} "
+        f"{token.name} "
+        f"({token.symbol})\n\n"
+
+        f"💰 MC: "
+        f"${token.market_cap:,.0f}\n"
+
+        f"💧 Liquidity: "
+        f"${token.liquidity:,.0f}\n"
+
+        f"📊 Volume: "
+        f"${token.volume:,.0f}\n"
+
+        f"📈 Change: "
+        f"{token.price_change:.2f}%\n"
+
+        f"⚡ AI Score: "
+        f"{token.ai_score:.2f}\n"
+
+        f"🚀 Velocity: "
+        f"{token.velocity_score:.2f}\n"
+
+        f"🧠 Buy Pressure: "
+        f"{token.buy_pressure:.2f}\n"
+
+        f"⚠ Rug Risk: "
+        f"{risk}\n"
+
+        f"⏱ Age: "
+        f"{token.age} mins\n\n"
+
+        f"🔗 {token.url}"
+    )
+
+# Rendered once per alert and shared by every
+# recipient in the fan-out
+
+AlertPayload = namedtuple(
+    "AlertPayload",
+    (
+        "text",
+        "reply_markup"
+    )
+)
+
+
+def build_payload(token):
+
+    return AlertPayload(
+        format_alert(token),
+        token_keyboard(token.address)
+    )
+
+# =========================================================
+# DUPLICATE ALERT PREVENTION
+# =========================================================
+
+# Backed by the sent_alerts table so restarts do not
+# re-alert. Memory holds the current window only and
+# new rows are written in batches after each scan.
+
+ALERT_DEDUP_WINDOW = 86400
+
+sent_alerts = TTLCache(
+    maxsize=50000,
+    ttl=ALERT_DEDUP_WINDOW
+)
+
+pending_alerts = []
+
+LOAD_SENT_ALERTS_SQL = """
+SELECT token_address, timestamp
+FROM sent_alerts
+WHERE timestamp > ?
+"""
+
+SAVE_SENT_ALERT_SQL = """
+INSERT OR REPLACE
+INTO sent_alerts
+(
+    token_address,
+    timestamp
+)
+VALUES (?, ?)
+"""
+
+PRUNE_SENT_ALERTS_SQL = """
+DELETE FROM sent_alerts
+WHERE timestamp <= ?
+"""
+
+
+def alert_sent(address):
+
+    return (
+        sent_alerts.get(address)
+        is not None
+    )
+
+
+def should_send_alert(address):
+
+    if sent_alerts.get(address) is not None:
+        return False
+
+    now = int(time.time())
+
+    sent_alerts.set(
+        address,
+        now
+    )
+
+    pending_alerts.append(
+        (
+            address,
+            now
+        )
+    )
+
+    return True
+
+
+async def load_sent_alerts():
+
+    now = int(time.time())
+
+    rows = await db_fetchall(
+        LOAD_SENT_ALERTS_SQL,
+        (now - ALERT_DEDUP_WINDOW,)
+    )
+
+    for address, timestamp in rows:
+
+        sent_alerts.set(
+            address,
+            timestamp,
+            ttl=timestamp + ALERT_DEDUP_WINDOW - now
+        )
+
+    logging.info(
+        f"Loaded {len(rows)} sent alerts"
+    )
+
+
+async def flush_sent_alerts():
+
+    if not pending_alerts:
+        return
+
+    rows = pending_alerts[:]
+
+    pending_alerts.clear()
+
+    # queued together so the writer commits
+    # them in one transaction
+    results = await asyncio.gather(
+        *[
+            db_write(
+                SAVE_SENT_ALERT_SQL,
+                row
+            )
+            for row in rows
+        ],
+        db_write(
+            PRUNE_SENT_ALERTS_SQL,
+            (
+                int(time.time())
+                - ALERT_DEDUP_WINDOW,
+            )
+        ),
+        return_exceptions=True
+    )
+
+    failed = []
+
+    for row, result in zip(rows, results):
+
+        if isinstance(result, Exception):
+
+            failed.append(row)
+
+            error = result
+
+    if failed:
+
+        # kept for the next flush so the dedup
+        # survives a restart
+        pending_alerts[:0] = failed
+
+        logging.warning(
+            f"Saving {len(failed)} sent alerts "
+            f"failed: {error}"
+        )
+
+# =========================================================
+# KEYBOARDS
+# =========================================================
+
+def main_menu():
+
+    kb = InlineKeyboardBuilder()
+
+    kb.button(
+        text="📊 Scanner",
+        callback_data="scanner"
+    )
+
+    kb.button(
+        text="⭐ Watchlist",
+        callback_data="watchlist"
+    )
+
+    kb.button(
+        text="🔥 Trending",
+        callback_data="trending"
+    )
+
+    kb.button(
+        text="⚙ Settings",
+        callback_data="settings"
+    )
+
+    kb.button(
+        text="🆔 My ID",
+        callback_data="myid"
+    )
+
+    kb.button(
+        text="📡 Status",
+        callback_data="status"
+    )
+
+    kb.adjust(2)
+
+    return kb.as_markup()
+
+
+def token_keyboard(address):
+
+    kb = InlineKeyboardBuilder()
+
+    kb.button(
+        text="⭐ Track",
+        callback_data=f"track:{address}"
+    )
+
+    kb.button(
+        text="❌ Ignore",
+        callback_data="ignore"
+    )
+
+    kb.adjust(2)
+
+    return kb.as_markup()
+
+# =========================================================
+# COMMANDS
+# =========================================================
+
+@router.message(Command("start"))
+async def start_handler(
+    message: Message
+):
+
+    await message.answer(
+        (
+            "🔥 Welcome to "
+            "AI Crypto Scanner Bot\n\n"
+
+            "Real-time Solana "
+            "token intelligence."
+        ),
+        reply_markup=main_menu()
+    )
+
+
+@router.message(Command("help"))
+async def help_handler(
+    message: Message
+):
+
+    await message.answer(
+        "Choose an option below:",
+        reply_markup=main_menu()
+    )
+
+'''
+@router.message(Command("myid"))
+async def myid_handler(
+    message: Message
+):
+
+    await message.answer(
+        f"🆔 {message.chat.id}"
+    )
+
+
+@router.message(Command("status"))
+async def status_handler(
+    message: Message
+):
+
+    registered = await is_registered(
+        message.chat.id
+    )
+
+    if registered:
+
+        await message.answer(
+            "✅ Approved"
+        )
+
+    else:
+
+        await message.answer(
+            (
+                "❌ Not approved.\n\n"
+                f"Send ID to "
+                f"{ADMIN_USERNAME}"
+            )
+        )
+
+
+@router.message(Command("watchlist"))
+async def watchlist_handler(
+    message: Message
+):
+
+    tokens = await get_watchlist(
+        message.chat.id
+    )
+
+    if not tokens:
+
+        await message.answer(
+            "📭 Empty watchlist"
+        )
+
+        return
+
+    msg = "⭐ WATCHLIST\n\n"
+
+    msg += "\n".join(tokens)
+
+    await message.answer(msg)
+'''
+# =========================================================
+# ADMIN
+# =========================================================
+
+@router.message(Command("register"))
+async def register_handler(
+    message: Message
+):
+
+    if (
+        message.chat.id
+        != ADMIN_CHAT_ID
+    ):
+        return
+
+    try:
+
+        user_id = int(
+            message.text.split()[1]
+        )
+
+        await add_user(user_id)
+
+        await message.answer(
+            f"✅ Registered {user_id}"
+        )
+
+        await bot.send_message(
+            user_id,
+            (
+                "✅ You are now approved."
+            )
+        )
+
+    except Exception:
+
+        await message.answer(
+            "Usage:\n/register USER_ID"
+        )
+
+@router.message()
+async def ignore_text(
+    message: Message
+):
+
+    await message.answer(
+        (
+            "⚠ Please use the menu buttons.\n"
+            "Use '/help' to access buttons"
+        ),
+        #reply_markup=main_menu()
+    )
+    
+# =========================================================
+# CALLBACKS
+# =========================================================
+
+@router.callback_query()
+async def callback_handler(
+    callback: CallbackQuery
+):
+
+    data = callback.data
+
+    if data.startswith("track:"):
+
+        token = data.split(
+            ":",
+            1
+        )[1]
+
+        await track_token(
+            callback.from_user.id,
+            token
+        )
+
+        await callback.message.answer(
+            "⭐ Added to watchlist"
+        )
+
+    elif data == "scanner":
+
+        await callback.message.answer(
+            "📊 Scanner running live"
+        )
+
+    elif data == "watchlist":
+
+        tokens = await get_watchlist(
+            callback.from_user.id
+        )
+
+        if tokens:
+
+            await callback.message.answer(
+                "\n".join(tokens)
+            )
+
+        else:
+
+            await callback.message.answer(
+                "📭 Empty watchlist"
+            )
+
+    elif data == "settings":
+
+        await callback.message.answer(
+            (
+                "⚙ Settings panel "
+                "coming soon"
+            )
+        )
+        
+    elif data == "help":
+
+    	await callback.message.answer(
+        	(
+            	"🔥 AI Crypto Scanner Bot\n\n"
+
+            	"Use the buttons below "
+            	"to navigate the bot."
+        	),
+        	reply_markup=main_menu()
+    	)
+        
+    elif data == "myid":
+        await callback.message.answer(
+        	f"🆔 {callback.from_user.id}"
+    	)
+    
+    elif data == "status":
+    	registered = await is_registered(
+    		callback.from_user.id
+    	)
+    	
+    	if registered:
+    		await callback.message.answer(
+    			"✅ Approved"
+    		)
+    		
+    	else:
+    		await callback.message.answer(
+    			(
+    				"❌ Not approved.\n\n"
+    				f"Send ID to {ADMIN_USERNAME} to get approved\n"
+    				"*Use the MyID button to retrieve chat id*"
+    				
+    			)
+    		
+    		)
+    
+
+    await callback.answer()
+
+# =========================================================
+# FETCH TOKEN
+# =========================================================
+
+DEX_URL = (
+    "https://api.dexscreener.com/"
+    "tokens/v1/solana/{}"
+)
+
+async def lookup_token(
+    token_address
+):
+
+    # returns (hit, analyzed) from the caches
+
+    cached = await get_cached_token(
+        token_address
+    )
+
+    if cached:
+        return True, cached
+
+    if await is_rejected(token_address):
+        return True, None
+
+    pairs = await get_cached_pairs(
+        token_address
+    )
+
+    if pairs is not None:
+
+        return True, await resolve_token(
+            token_address,
+            pairs
+        )
+
+    return False, None
+
+
+async def resolve_token(
+    token_address,
+    pairs
+):
+
+    start = time.perf_counter()
+
+    verdict = evaluate_token(pairs)
+
+    analyze_time.observe(
+        time.perf_counter() - start
+    )
+
+    return await store_verdict(
+        token_address,
+        pairs,
+        verdict
+    )
+
+
+async def store_verdict(
+    token_address,
+    pairs,
+    verdict,
+    notify=True
+):
+
+    if pairs is not None:
+
+        await cache_pairs(
+            token_address,
+            pairs
+        )
+
+    analyzed, reason, age = verdict
+
+    if analyzed:
+
+        await cache_token(
+            token_address,
+            analyzed
+        )
+
+        if notify:
+
+            notify_momentum(
+                token_address,
+                analyzed
+            )
+
+    else:
+
+        await cache_reject(
+            token_address,
+            reason,
+            age
+        )
+
+        # a tracked token that fails the filters, e.g.
+        # after its liquidity was pulled, still feeds
+        # its history; pairs stay in the analysis
+        # process in pool mode
+        if (
+            notify
+            and pairs is not None
+            and token_address in trackers
+        ):
+
+            measured = measure_token(pairs)
+
+            if measured:
+
+                notify_momentum(
+                    token_address,
+                    measured
+                )
+
+        if (
+            reason == "too_young"
+            and token_address
+            in stream_candidates.entries
+        ):
+
+            recheck_candidate(
+                token_address,
+                reject_ttl(reason, age)
+            )
+
+    return analyzed
+
+
+# Single-flight: one upstream fetch per address at a
+# time, concurrent callers await the same future
+
+inflight = {}
+
+
+def begin_flight(token_address):
+
+    future = (
+        asyncio.get_running_loop()
+        .create_future()
+    )
+
+    inflight[token_address] = future
+
+    return future
+
+
+def end_flight(
+    token_address,
+    analyzed
+):
+
+    future = inflight.pop(
+        token_address,
+        None
+    )
+
+    if future is not None and not future.done():
+        future.set_result(analyzed)
+
+# =========================================================
+# RATE LIMITING
+# =========================================================
+
+class TokenBucket:
+
+    __slots__ = (
+        "rate",
+        "capacity",
+        "tokens",
+        "updated"
+    )
+
+    def __init__(
+        self,
+        rate,
+        capacity
+    ):
+
+        self.rate = rate
+
+        self.capacity = capacity
+
+        self.tokens = capacity
+
+        self.updated = time.monotonic()
+
+    def refill(self):
+
+        now = time.monotonic()
+
+        self.tokens = min(
+            self.capacity,
+            self.tokens
+            + (now - self.updated) * self.rate
+        )
+
+        self.updated = now
+
+    def pause(self, seconds):
+
+        # no tokens until `seconds` from now,
+        # never shortening a longer pause
+        self.refill()
+
+        self.tokens = min(
+            self.tokens,
+            -seconds * self.rate
+        )
+
+    def try_acquire(self):
+
+        self.refill()
+
+        if self.tokens >= 1:
+
+            self.tokens -= 1
+
+            return True
+
+        return False
+
+    async def acquire(self):
+
+        while True:
+
+            self.refill()
+
+            if self.tokens >= 1:
+
+                self.tokens -= 1
+
+                return
+
+            await asyncio.sleep(
+                (1 - self.tokens) / self.rate
+            )
+
+# Dexscreener limits per endpoint, requests per minute
+
+API_RATE_LIMITS = {
+    "tokens": 300,
+    "token-profiles": 60,
+    "token-boosts": 60
+}
+
+API_BACKOFF_MAX = 120
+
+
+class EndpointBudget:
+
+    def __init__(self, per_minute):
+
+        # allow ~10s worth of burst
+        self.bucket = TokenBucket(
+            per_minute / 60,
+            max(per_minute / 6, 1)
+        )
+
+        self.strikes = 0
+
+        self.statuses = {}
+
+    def record(self, response):
+
+        status = response.status
+
+        self.statuses[status] = (
+            self.statuses.get(status, 0) + 1
+        )
+
+        remaining = response.headers.get(
+            "X-RateLimit-Remaining"
+        )
+
+        if remaining is not None:
+
+            self.bucket.refill()
+
+            self.bucket.tokens = min(
+                self.bucket.tokens,
+                safe_float(remaining)
+            )
+
+        if status != 429:
+
+            self.strikes = 0
+
+            return
+
+        self.strikes += 1
+
+        delay = safe_float(
+            response.headers.get("Retry-After"),
+            None
+        )
+
+        if delay is None:
+
+            delay = min(
+                API_BACKOFF_MAX,
+                2 ** self.strikes
+            )
+
+        # jitter so retries do not line up
+        self.bucket.pause(
+            delay * random.uniform(1, 1.5)
+        )
+
+        scan_scheduler.throttled = True
+
+        logging.warning(
+            f"Rate limited, backing off "
+            f"{delay:.0f}s"
+        )
+
+    def headroom(self):
+
+        self.bucket.refill()
+
+        return (
+            self.bucket.tokens
+            / self.bucket.capacity
+        )
+
+
+api_budgets = {}
+
+
+def endpoint_budget(url):
+
+    # https://host/<endpoint>/...
+    endpoint = (
+        url.split("://", 1)[-1]
+        .split("/")[1]
+    )
+
+    budget = api_budgets.get(endpoint)
+
+    if budget is None:
+
+        budget = api_budgets[endpoint] = (
+            EndpointBudget(
+                API_RATE_LIMITS.get(
+                    endpoint,
+                    60
+                )
+            )
+        )
+
+    return budget
+
+
+async def api_get(
+    session,
+    url,
+    decode=True
+):
+
+    # returns (status, json or None), or the raw
+    # body instead of json when decode is False
+
+    budget = endpoint_budget(url)
+
+    await budget.bucket.acquire()
+
+    start = time.perf_counter()
+
+    try:
+
+        async with session.get(
+            url
+        ) as response:
+
+            budget.record(response)
+
+            if response.status != 200:
+                return response.status, None
+
+            if not decode:
+                return 200, await response.read()
+
+            return 200, await response.json(
+                loads=json_loads
+            )
+
+    except Exception as e:
+
+        fetch_errors.inc(type(e).__name__)
+
+        raise
+
+    finally:
+
+        fetch_latency.observe(
+            time.perf_counter() - start
+        )
+
+# =========================================================
+# SCAN SCHEDULER
+# =========================================================
+
+# The pause between scans follows API feedback: it
+# doubles after throttling, shrinks while there is
+# budget headroom and plenty of new tokens, and
+# otherwise drifts back to SCAN_INTERVAL.
+
+MIN_SCAN_INTERVAL = 15
+
+MAX_SCAN_INTERVAL = 300
+
+FAST_SCAN_NEW_TOKENS = 20
+
+
+class ScanScheduler:
+
+    def __init__(self):
+
+        self.interval = SCAN_INTERVAL
+
+        self.throttled = False
+
+        self.new_tokens = 0
+
+    def headroom(self):
+
+        return all(
+            budget.headroom() >= 0.5
+            for budget in api_budgets.values()
+        )
+
+    def next_interval(self):
+
+        if self.throttled:
+
+            self.interval = min(
+                MAX_SCAN_INTERVAL,
+                self.interval * 2
+            )
+
+        elif (
+            self.new_tokens
+            >= FAST_SCAN_NEW_TOKENS
+            and self.headroom()
+        ):
+
+            self.interval = max(
+                MIN_SCAN_INTERVAL,
+                self.interval * 0.75
+            )
+
+        else:
+
+            self.interval += (
+                SCAN_INTERVAL - self.interval
+            ) * 0.25
+
+        self.throttled = False
+
+        self.new_tokens = 0
+
+        return self.interval * random.uniform(
+            0.9,
+            1.1
+        )
+
+
+scan_scheduler = ScanScheduler()
+
+# =========================================================
+# PIPELINE
+# =========================================================
+
+# discovery -> enrichment -> scoring -> delivery. Stages
+# are joined by bounded queues, so a slow stage applies
+# backpressure instead of stalling the others.
+
+PIPELINE_QUEUE_SIZE = 20
+
+SCORE_WORKERS = 1
+
+
+class Stage:
+
+    def __init__(
+        self,
+        name,
+        handler,
+        workers,
+        maxsize
+    ):
+
+        self.name = name
+
+        self.handler = handler
+
+        self.workers = workers
+
+        self.queue = asyncio.Queue(
+            maxsize=maxsize
+        )
+
+        self.processed = 0
+
+        self.errors = 0
+
+        self.dropped = 0
+
+        self.wait_time = 0.0
+
+        self.busy_time = 0.0
+
+        self.max_latency = 0.0
+
+    async def put(self, item):
+
+        await self.queue.put(
+            (time.monotonic(), item)
+        )
+
+    def offer(self, item):
+
+        # non-blocking put for producers that
+        # must never wait on this stage
+        try:
+
+            self.queue.put_nowait(
+                (time.monotonic(), item)
+            )
+
+            return True
+
+        except asyncio.QueueFull:
+
+            self.dropped += 1
+
+            return False
+
+    def start(self):
+
+        return [
+            asyncio.create_task(self.run())
+            for _ in range(self.workers)
+        ]
+
+    async def run(self):
+
+        while True:
+
+            queued, item = await self.queue.get()
+
+            start = time.monotonic()
+
+            try:
+
+                await self.handler(item)
+
+            except Exception as e:
+
+                self.errors += 1
+
+                logging.warning(
+                    f"{self.name} error: {e}"
+                )
+
+            finally:
+
+                done = time.monotonic()
+
+                self.processed += 1
+
+                self.wait_time += start - queued
+
+                self.busy_time += done - start
+
+                self.max_latency = max(
+                    self.max_latency,
+                    done - queued
+                )
+
+                self.queue.task_done()
+
+    def stats(self):
+
+        n = max(self.processed, 1)
+
+        return {
+            "depth": self.queue.qsize(),
+            "workers": self.workers,
+            "processed": self.processed,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "avg_wait_ms": self.wait_time / n * 1000,
+            "avg_busy_ms": self.busy_time / n * 1000,
+            "max_latency_ms": self.max_latency * 1000
+        }
+
+
+class ScanRound:
+
+    # One pass of tokens through the pipeline. Done
+    # when every submitted chunk has been scored.
+
+    def __init__(
+        self,
+        on_result=None
+    ):
+
+        self.on_result = on_result
+
+        self.results = []
+
+        self.pending = 0
+
+        self.sealed = False
+
+        self.closed = False
+
+        self.done = asyncio.Event()
+
+    def collect(self, tokens):
+
+        if self.closed:
+            return
+
+        self.results.extend(tokens)
+
+        if self.on_result is None:
+            return
+
+        for token in tokens:
+            self.on_result(token)
+
+    def chunk_done(self):
+
+        self.pending -= 1
+
+        if self.sealed and self.pending == 0:
+            self.done.set()
+
+    def seal(self):
+
+        self.sealed = True
+
+        if self.pending == 0:
+            self.done.set()
+
+# =========================================================
+# BATCHED FETCH
+# =========================================================
+
+# Dexscreener accepts up to 30 comma separated
+# addresses per tokens/v1 request
+
+DEX_BATCH_SIZE = 30
+
+# fetch_pairs result for a 429: the chunk is worth
+# retrying once the endpoint bucket pause is over
+
+RATE_LIMITED = object()
+
+
+async def fetch_pairs(
+    session,
+    addresses,
+    decode=True
+):
+
+    # returns {address: [pairs]}, or the raw body
+    # when decode is False, None on failure
+
+    try:
+
+        status, data = await api_get(
+            session,
+            DEX_URL.format(
+                ",".join(addresses)
+            ),
+            decode
+        )
+
+        if status == 429:
+            return RATE_LIMITED
+
+        if status != 200:
+            return None
+
+    except Exception as e:
+
+        logging.warning(
+            f"Batch fetch error: {e}"
+        )
+
+        return None
+
+    if not decode:
+        return data
+
+    return group_pairs(data)
+
+
+async def score_pairs(
+    addresses,
+    payload
+):
+
+    start = time.perf_counter()
+
+    if analysis_pool:
+
+        # raw body, parsed and scored in a worker
+        # process; pairs stay there
+        items = [None] * len(addresses)
+
+        try:
+
+            verdicts = await (
+                asyncio.get_running_loop()
+                .run_in_executor(
+                    analysis_pool,
+                    analyze_payload,
+                    addresses,
+                    payload,
+                    filter_bounds
+                )
+            )
+
+        except Exception as e:
+
+            # e.g. an HTML error page served with 200
+            logging.warning(
+                f"Analysis error: {e}"
+            )
+
+            verdicts = [
+                (None, "error", 0)
+            ] * len(addresses)
+
+    else:
+
+        items = [
+            payload.get(
+                address,
+                []
+            )
+            for address in addresses
+        ]
+
+        verdicts = evaluate_batch(items)
+
+    results = []
+
+    analyze_time.observe(
+        time.perf_counter() - start
+    )
+
+    for address, pairs, verdict in zip(
+        addresses,
+        items,
+        verdicts
+    ):
+
+        analyzed = await store_verdict(
+            address,
+            pairs,
+            verdict
+        )
+
+        end_flight(
+            address,
+            analyzed
+        )
+
+        if analyzed:
+            results.append(analyzed)
+
+    return results
+
+
+async def enrich(job):
+
+    scan, chunk = job
+
+    handed_off = False
+
+    try:
+
+        # skip chunks of rounds that already
+        # finished or timed out
+        if scan.closed:
+            return
+
+        payload = await fetch_pairs(
+            http_session,
+            chunk,
+            analysis_pool is None
+        )
+
+        while payload is RATE_LIMITED:
+
+            if scan.closed:
+                return
+
+            # back of the queue while the round is
+            # open; the next attempt waits out the
+            # bucket pause in api_get. A full queue
+            # retries here instead.
+            if not enrichment_stage.queue.full():
+
+                await enrichment_stage.put(job)
+
+                handed_off = True
+
+                return
+
+            payload = await fetch_pairs(
+                http_session,
+                chunk,
+                analysis_pool is None
+            )
+
+        if payload is None:
+            return
+
+        await scoring_stage.put(
+            (
+                scan,
+                chunk,
+                payload
+            )
+        )
+
+        handed_off = True
+
+    finally:
+
+        if not handed_off:
+
+            for address in chunk:
+                end_flight(address, None)
+
+            scan.chunk_done()
+
+
+async def score(job):
+
+    scan, chunk, payload = job
+
+    try:
+
+        scan.collect(
+            await score_pairs(
+                chunk,
+                payload
+            )
+        )
+
+    finally:
+
+        # no-op for flights score_pairs resolved
+        for address in chunk:
+            end_flight(address, None)
+
+        scan.chunk_done()
+
+
+enrichment_stage = Stage(
+    "enrichment",
+    enrich,
+    SCAN_CONCURRENCY,
+    PIPELINE_QUEUE_SIZE
+)
+
+scoring_stage = Stage(
+    "scoring",
+    score,
+    SCORE_WORKERS,
+    PIPELINE_QUEUE_SIZE
+)
+
+
+async def fetch_tokens(
+    candidates,
+    on_result=None,
+    deadline=None
+):
+
+    # candidates: list of (priority, address),
+    # lowest priority value is fetched first.
+    # on_result is called as each token resolves.
+    # deadline (monotonic) defaults to SCAN_TIMEOUT
+    # from now.
+
+    if deadline is None:
+        deadline = time.monotonic() + SCAN_TIMEOUT
+
+    scan = ScanRound(on_result)
+
+    pending = []
+
+    def shared(future):
+
+        if future.result():
+            scan.collect([future.result()])
+
+        scan.chunk_done()
+
+    for _, address in sorted(
+        candidates
+    ):
+
+        hit, cached = await lookup_token(
+            address
+        )
+
+        if cached:
+            scan.collect([cached])
+
+        elif hit:
+            continue
+
+        elif address in inflight:
+
+            # already being fetched elsewhere
+            scan.pending += 1
+
+            inflight[address].add_done_callback(
+                shared
+            )
+
+        elif len(pending) < SCAN_BUDGET:
+
+            begin_flight(address)
+
+            pending.append(address)
+
+    queued = []
+
+    async def submit():
+
+        for chunk in chunked(
+            pending,
+            DEX_BATCH_SIZE
+        ):
+
+            scan.pending += 1
+
+            await enrichment_stage.put(
+                (scan, chunk)
+            )
+
+            queued.extend(chunk)
+
+        scan.seal()
+
+        await scan.done.wait()
+
+    try:
+
+        await asyncio.wait_for(
+            submit(),
+            max(deadline - time.monotonic(), 0)
+        )
+
+    except asyncio.TimeoutError:
+
+        logging.warning(
+            f"Scan timed out after "
+            f"{SCAN_TIMEOUT}s, "
+            f"keeping {len(scan.results)} results"
+        )
+
+    finally:
+
+        scan.closed = True
+
+        # chunks the timeout cut off before they were
+        # queued would otherwise stay in flight forever
+        for address in pending[len(queued):]:
+            end_flight(address, None)
+
+    return scan.results
+
+
+def pipeline_stats():
+
+    return {
+        stage.name: stage.stats()
+        for stage in (
+            enrichment_stage,
+            scoring_stage,
+            delivery_stage
+        )
+    }
+
+# =========================================================
+# DISCOVERY FEEDS
+# =========================================================
+
+DISCOVERY_FEEDS = (
+    "https://api.dexscreener.com/"
+    "token-profiles/latest/v1",
+
+    "https://api.dexscreener.com/"
+    "token-boosts/latest/v1",
+
+    "https://api.dexscreener.com/"
+    "token-boosts/top/v1"
+)
+
+Profile = namedtuple(
+    "Profile",
+    (
+        "chain_id",
+        "token_address"
+    )
+)
+
+
+async def fetch_feed(
+    session,
+    url,
+    deadline
+):
+
+    try:
+
+        status = 429
+
+        # retry after each bucket pause rather than
+        # losing this feed for the cycle
+        while status == 429:
+
+            status, data = await asyncio.wait_for(
+                api_get(
+                    session,
+                    url
+                ),
+                max(deadline - time.monotonic(), 0)
+            )
+
+        if status != 200:
+            return []
+
+    except asyncio.TimeoutError:
+
+        logging.warning(
+            f"Feed still rate limited at the "
+            f"scan deadline: {url}"
+        )
+
+        return []
+
+    except Exception as e:
+
+        logging.warning(
+            f"Feed error: {e}"
+        )
+
+        return []
+
+    if isinstance(data, dict):
+        data = [data]
+
+    profiles = []
+
+    for item in data or []:
+
+        try:
+
+            profile = Profile(
+                item.get("chainId"),
+                item.get("tokenAddress")
+            )
+
+        except AttributeError:
+            continue
+
+        profiles.append(profile)
+
+    return profiles
+
+
+async def fetch_profiles(
+    session,
+    deadline=None
+):
+
+    if deadline is None:
+        deadline = time.monotonic() + SCAN_TIMEOUT
+
+    return await asyncio.gather(
+        *[
+            fetch_feed(
+                session,
+                url,
+                deadline
+            )
+            for url in DISCOVERY_FEEDS
+        ]
+    )
+
+# =========================================================
+# STREAMING DISCOVERY
+# =========================================================
+
+# New pools are picked up from Solana logsSubscribe as
+# they are created instead of waiting for the profiles
+# feed. Disabled unless SOLANA_WS_URL is set.
+# SOLANA_WS_REPLAY=<file.jsonl> serves recorded events
+# from a local stand-in server instead.
+
+SOLANA_WS_URL = os.getenv("SOLANA_WS_URL")
+
+SOLANA_RPC_URL = os.getenv(
+    "SOLANA_RPC_URL",
+    "https://api.mainnet-beta.solana.com"
+)
+
+SOLANA_WS_REPLAY = os.getenv(
+    "SOLANA_WS_REPLAY"
+)
+
+STREAM_REPLAY_PORT = 8899
+
+RAYDIUM_AMM_PROGRAM = (
+    "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8"
+)
+
+PUMP_FUN_PROGRAM = (
+    "6EF8rrecthR5Dkzon8Nwu78hRvfCKubJ14M5uBEwF6P"
+)
+
+STREAM_PROGRAMS = (
+    RAYDIUM_AMM_PROGRAM,
+    PUMP_FUN_PROGRAM
+)
+
+WSOL_MINT = (
+    "So11111111111111111111111111111111111111112"
+)
+
+# Anchor event discriminator of pump.fun CreateEvent
+PUMP_CREATE_EVENT = hashlib.sha256(
+    b"event:CreateEvent"
+).digest()[:8]
+
+STREAM_BACKFILL_LIMIT = 100
+
+STREAM_FLUSH_INTERVAL = 5
+
+STREAM_RECONNECT_MAX = 60
+
+B58_ALPHABET = (
+    "123456789ABCDEFGHJKLMNPQRSTUVWXYZ"
+    "abcdefghijkmnopqrstuvwxyz"
+)
+
+# streamed mints stay scan candidates while
+# they are young enough to pass the age filter
+stream_candidates = TTLCache(
+    maxsize=5000,
+    ttl=MAX_AGE_MINUTES * 60
+)
+
+stream_pending = []
+
+stream_tasks = set()
+
+# newest signature seen per program, for backfill
+last_signatures = {}
+
+
+def b58encode(raw):
+
+    n = int.from_bytes(raw, "big")
+
+    out = []
+
+    while n:
+
+        n, r = divmod(n, 58)
+
+        out.append(B58_ALPHABET[r])
+
+    pad = len(raw) - len(raw.lstrip(b"\0"))
+
+    return "1" * pad + "".join(
+        reversed(out)
+    )
+
+
+def is_new_pool(
+    program,
+    logs
+):
+
+    if program == PUMP_FUN_PROGRAM:
+
+        # exact match, CreateIdempotent is
+        # the token account program
+        return (
+            "Program log: Instruction: Create"
+            in logs
+        )
+
+    return any(
+        line.startswith(
+            "Program log: initialize2"
+        )
+        for line in logs
+    )
+
+
+def decode_create_event(logs):
+
+    for line in logs:
+
+        if not line.startswith(
+            "Program data: "
+        ):
+            continue
+
+        try:
+            raw = base64.b64decode(line[14:])
+
+        except Exception:
+            continue
+
+        if raw[:8] != PUMP_CREATE_EVENT:
+            continue
+
+        # name, symbol, uri are borsh strings,
+        # the mint pubkey follows
+        offset = 8
+
+        for _ in range(3):
+
+            length = int.from_bytes(
+                raw[offset:offset + 4],
+                "little"
+            )
+
+            offset += 4 + length
+
+        mint = raw[offset:offset + 32]
+
+        if len(mint) == 32:
+            return b58encode(mint)
+
+    return None
+
+
+def mint_from_transaction(tx):
+
+    if not tx:
+        return None
+
+    balances = (
+        (tx.get("meta") or {})
+        .get("postTokenBalances")
+        or []
+    )
+
+    for balance in balances:
+
+        mint = balance.get("mint")
+
+        if mint and mint != WSOL_MINT:
+            return mint
+
+    return None
+
+
+async def rpc_call(
+    method,
+    params
+):
+
+    try:
+
+        async with http_session.post(
+            SOLANA_RPC_URL,
+            json={
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": method,
+                "params": params
+            }
+        ) as response:
+
+            if response.status != 200:
+                return None
+
+            data = await response.json(
+                loads=json_loads
+            )
+
+    except Exception as e:
+
+        logging.warning(
+            f"RPC error: {e}"
+        )
+
+        return None
+
+    return data.get("result")
+
+
+async def get_transaction(signature):
+
+    return await rpc_call(
+        "getTransaction",
+        [
+            signature,
+            {
+                "encoding": "jsonParsed",
+                "commitment": "confirmed",
+                "maxSupportedTransactionVersion": 0
+            }
+        ]
+    )
+
+
+def push_candidate(mint):
+
+    if mint in stream_candidates.entries:
+        return
+
+    stream_candidates.set(
+        mint,
+        time.time()
+    )
+
+    stream_pending.append(mint)
+
+    logging.info(
+        f"Streamed new pool {mint}"
+    )
+
+
+def requeue_candidate(mint):
+
+    if (
+        mint in stream_candidates.entries
+        and mint not in stream_pending
+    ):
+        stream_pending.append(mint)
+
+
+def recheck_candidate(
+    mint,
+    delay
+):
+
+    # look again once a too_young rejection has
+    # expired instead of waiting for the next scan
+    asyncio.get_running_loop().call_later(
+        delay + 1,
+        requeue_candidate,
+        mint
+    )
+
+
+async def resolve_pool(
+    program,
+    signature,
+    logs,
+    tx=None
+):
+
+    mint = None
+
+    if program == PUMP_FUN_PROGRAM:
+        mint = decode_create_event(logs)
+
+    if mint is None:
+
+        if tx is None:
+            tx = await get_transaction(
+                signature
+            )
+
+        mint = mint_from_transaction(tx)
+
+    if mint:
+        push_candidate(mint)
+
+
+def handle_logs(
+    program,
+    value
+):
+
+    signature = value.get("signature")
+
+    if signature:
+        last_signatures[program] = signature
+
+    logs = value.get("logs") or []
+
+    if value.get("err"):
+        return
+
+    if not is_new_pool(program, logs):
+        return
+
+    # resolve off the socket reader so a slow
+    # getTransaction never stalls notifications
+    task = asyncio.create_task(
+        resolve_pool(
+            program,
+            signature,
+            logs
+        )
+    )
+
+    stream_tasks.add(task)
+
+    task.add_done_callback(
+        stream_tasks.discard
+    )
+
+
+async def backfill_program(program):
+
+    until = last_signatures.get(program)
+
+    if until is None:
+        return
+
+    signatures = await rpc_call(
+        "getSignaturesForAddress",
+        [
+            program,
+            {
+                "until": until,
+                "limit": STREAM_BACKFILL_LIMIT,
+                "commitment": "confirmed"
+            }
+        ]
+    ) or []
+
+    if signatures:
+
+        last_signatures[program] = (
+            signatures[0]["signature"]
+        )
+
+    # oldest first
+    for item in reversed(signatures):
+
+        if item.get("err"):
+            continue
+
+        tx = await get_transaction(
+            item["signature"]
+        )
+
+        logs = (
+            (tx or {}).get("meta") or {}
+        ).get("logMessages") or []
+
+        if is_new_pool(program, logs):
+
+            await resolve_pool(
+                program,
+                item["signature"],
+                logs,
+                tx
+            )
+
+
+async def stream_discovery():
+
+    delay = 1
+
+    while True:
+
+        try:
+
+            async with http_session.ws_connect(
+                SOLANA_WS_URL,
+                heartbeat=30
+            ) as ws:
+
+                for i, program in enumerate(
+                    STREAM_PROGRAMS
+                ):
+
+                    await ws.send_json({
+                        "jsonrpc": "2.0",
+                        "id": i + 1,
+                        "method": "logsSubscribe",
+                        "params": [
+                            {"mentions": [program]},
+                            {"commitment": "confirmed"}
+                        ]
+                    })
+
+                # after subscribing, so nothing falls
+                # between the backfill and the stream
+                for program in STREAM_PROGRAMS:
+                    await backfill_program(program)
+
+                delay = 1
+
+                subscriptions = {}
+
+                async for msg in ws:
+
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break
+
+                    data = msg.json()
+
+                    if "id" in data:
+
+                        subscriptions[
+                            data.get("result")
+                        ] = STREAM_PROGRAMS[
+                            data["id"] - 1
+                        ]
+
+                        continue
+
+                    if (
+                        data.get("method")
+                        != "logsNotification"
+                    ):
+                        continue
+
+                    params = data["params"]
+
+                    program = subscriptions.get(
+                        params["subscription"]
+                    )
+
+                    if program is None:
+                        continue
+
+                    handle_logs(
+                        program,
+                        params["result"]["value"]
+                    )
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+
+            logging.warning(
+                f"Stream error: {e}"
+            )
+
+        logging.info(
+            f"Stream reconnecting in {delay}s"
+        )
+
+        await asyncio.sleep(delay)
+
+        delay = min(
+            delay * 2,
+            STREAM_RECONNECT_MAX
+        )
+
+
+async def stream_loop():
+
+    # analyze streamed mints within seconds
+    # instead of waiting for the next scan
+
+    while True:
+
+        await asyncio.sleep(
+            STREAM_FLUSH_INTERVAL
+        )
+
+        if not stream_pending:
+            continue
+
+        candidates = [
+            (-1, mint)
+            for mint in stream_pending
+        ]
+
+        stream_pending.clear()
+
+        try:
+
+            users = await get_users()
+
+            set_filter_bounds(users)
+
+            matcher = UserMatcher(users)
+
+            await fetch_tokens(
+                candidates,
+                alert_handler(matcher)
+            )
+
+            await flush_sent_alerts()
+
+        except Exception as e:
+
+            logging.warning(
+                f"Stream fetch error: {e}"
+            )
+
+# =========================================================
+# STREAM REPLAY
+# =========================================================
+
+# Local stand-in for the RPC websocket and HTTP
+# endpoints. Each JSONL record is one notification:
+# {"program", "signature", "logs", "err",
+#  "transaction", "delay"}
+
+async def start_replay_server(
+    path,
+    port=STREAM_REPLAY_PORT
+):
+
+    with open(path) as f:
+
+        records = [
+            json.loads(line)
+            for line in f
+            if line.strip()
+        ]
+
+    transactions = {
+        r["signature"]: r.get("transaction")
+        for r in records
+    }
+
+    async def replay(ws, subscriptions):
+
+        for record in records:
+
+            await asyncio.sleep(
+                record.get("delay", 0)
+            )
+
+            sub = subscriptions.get(
+                record["program"]
+            )
+
+            if sub is None:
+                continue
+
+            await ws.send_json({
+                "jsonrpc": "2.0",
+                "method": "logsNotification",
+                "params": {
+                    "subscription": sub,
+                    "result": {
+                        "context": {"slot": 0},
+                        "value": {
+                            "signature": record["signature"],
+                            "err": record.get("err"),
+                            "logs": record.get("logs", [])
+                        }
+                    }
+                }
+            })
+
+    async def ws_handler(request):
+
+        ws = web.WebSocketResponse()
+
+        await ws.prepare(request)
+
+        subscriptions = {}
+
+        task = None
+
+        async for msg in ws:
+
+            req = msg.json()
+
+            program = (
+                req["params"][0]["mentions"][0]
+            )
+
+            subscriptions[program] = (
+                len(subscriptions) + 1
+            )
+
+            await ws.send_json({
+                "jsonrpc": "2.0",
+                "id": req["id"],
+                "result": subscriptions[program]
+            })
+
+            if (
+                task is None
+                and len(subscriptions)
+                == len(STREAM_PROGRAMS)
+            ):
+                task = asyncio.create_task(
+                    replay(ws, subscriptions)
+                )
+
+        if task:
+            task.cancel()
+
+        return ws
+
+    async def rpc_handler(request):
+
+        req = await request.json()
+
+        result = None
+
+        if req["method"] == "getTransaction":
+            result = transactions.get(
+                req["params"][0]
+            )
+
+        elif (
+            req["method"]
+            == "getSignaturesForAddress"
+        ):
+            result = []
+
+        return web.json_response({
+            "jsonrpc": "2.0",
+            "id": req.get("id"),
+            "result": result
+        })
+
+    replay_app = web.Application()
+
+    replay_app.router.add_get(
+        "/",
+        ws_handler
+    )
+
+    replay_app.router.add_post(
+        "/",
+        rpc_handler
+    )
+
+    runner = web.AppRunner(replay_app)
+
+    await runner.setup()
+
+    await web.TCPSite(
+        runner,
+        "127.0.0.1",
+        port
+    ).start()
+
+    logging.info(
+        f"Replaying {len(records)} stream "
+        f"events on port {port}"
+    )
+
+    return runner
+
+# =========================================================
+# CONCURRENT TOKEN SCANNER
+# =========================================================
+
+async def scan_tokens(
+    on_result=None
+):
+
+    # feeds and pairs share one SCAN_TIMEOUT budget
+    deadline = time.monotonic() + SCAN_TIMEOUT
+
+    feeds = await fetch_profiles(
+        http_session,
+        deadline
+    )
+
+    ranks = {}
+
+    for feed in feeds:
+
+        for rank, profile in enumerate(
+            feed
+        ):
+
+            if not profile.token_address:
+                continue
+
+            if (
+                profile.chain_id
+                != "solana"
+            ):
+                continue
+
+            # newest entry in any feed first
+            ranks[profile.token_address] = min(
+                rank,
+                ranks.get(
+                    profile.token_address,
+                    rank
+                )
+            )
+
+    scan_scheduler.new_tokens = sum(
+        1
+        for address in ranks
+        if address not in token_cache.entries
+        and address not in reject_cache.entries
+    )
+
+    # streamed pools go ahead of every feed
+    for mint in list(
+        stream_candidates.entries
+    ):
+        ranks[mint] = -1
+
+    candidates = [
+        (rank, address)
+        for address, rank in ranks.items()
+    ]
+
+    return await fetch_tokens(
+        candidates,
+        on_result,
+        deadline
+    )
+
+# =========================================================
+# DELIVERY
+# =========================================================
+
+# Telegram allows ~30 msg/s per bot and ~1 msg/s
+# per chat. Sends are queued and drained by workers
+# so a slow fan-out never delays the next scan.
+
+GLOBAL_SEND_RATE = 30
+
+CHAT_SEND_RATE = 1
+
+CHAT_SEND_BURST = 3
+
+SEND_WORKERS = 8
+
+SEND_QUEUE_SIZE = 10000
+
+SEND_RETRIES = 3
+
+
+global_bucket = TokenBucket(
+    GLOBAL_SEND_RATE,
+    GLOBAL_SEND_RATE
+)
+
+chat_buckets = TTLCache(
+    maxsize=10000,
+    ttl=60
+)
+
+def chat_bucket(chat_id):
+
+    bucket = chat_buckets.get(chat_id)
+
+    if bucket is None:
+
+        bucket = TokenBucket(
+            CHAT_SEND_RATE,
+            CHAT_SEND_BURST
+        )
+
+    # refresh ttl on every use
+    chat_buckets.set(
+        chat_id,
+        bucket
+    )
+
+    return bucket
+
+
+def queue_message(
+    chat_id,
+    payload,
+    attempt=0
+):
+
+    job = (
+        chat_id,
+        payload,
+        attempt
+    )
+
+    if delivery_queues:
+        queued = offer_shard(job)
+
+    else:
+        queued = delivery_stage.offer(job)
+
+    if not queued:
+
+        logging.warning(
+            f"Send queue full, "
+            f"dropping message to {chat_id}"
+        )
+
+
+# chat id -> jobs waiting on that chat's bucket. Each
+# backlog drains on its own task, so a burst to one
+# chat never holds the send workers.
+
+chat_backlogs = {}
+
+chat_tasks = set()
+
+
+async def deliver(job):
+
+    chat_id = job[0]
+
+    backlog = chat_backlogs.get(chat_id)
+
+    if backlog is not None:
+
+        # behind earlier messages to this chat
+        backlog.append(job)
+
+        return
+
+    bucket = chat_bucket(chat_id)
+
+    if bucket.try_acquire():
+
+        await send_job(job, bucket)
+
+        return
+
+    chat_backlogs[chat_id] = deque([job])
+
+    task = asyncio.create_task(
+        drain_chat(chat_id, bucket)
+    )
+
+    chat_tasks.add(task)
+
+    task.add_done_callback(
+        chat_tasks.discard
+    )
+
+
+async def drain_chat(
+    chat_id,
+    bucket
+):
+
+    backlog = chat_backlogs[chat_id]
+
+    try:
+
+        while backlog:
+
+            await bucket.acquire()
+
+            await send_job(
+                backlog.popleft(),
+                bucket
+            )
+
+    finally:
+
+        del chat_backlogs[chat_id]
+
+
+async def drain_delivery():
+
+    await delivery_stage.queue.join()
+
+    # backlogged chats drain on their own tasks,
+    # and retries come back through the queue
+    while chat_tasks:
+
+        await asyncio.gather(
+            *chat_tasks,
+            return_exceptions=True
+        )
+
+        await delivery_stage.queue.join()
+
+
+async def send_job(
+    job,
+    bucket
+):
+
+    # the chat's token is already taken
+
+    chat_id, payload, attempt = job
+
+    try:
+
+        await global_bucket.acquire()
+
+        start = time.perf_counter()
+
+        try:
+
+            await bot.send_message(
+                chat_id,
+                payload.text,
+                reply_markup=payload.reply_markup
+            )
+
+        finally:
+
+            send_latency.observe(
+                time.perf_counter() - start
+            )
+
+    except TelegramRetryAfter as e:
+
+        send_errors.inc("retry_after")
+
+        # Telegram doesn't say whether the chat or
+        # the bot-wide limit tripped, so both wait
+        bucket.pause(e.retry_after)
+
+        global_bucket.pause(e.retry_after)
+
+        if attempt < SEND_RETRIES:
+
+            queue_message(
+                chat_id,
+                payload,
+                attempt + 1
+            )
+
+        else:
+
+            logging.warning(
+                f"Send error: {e}"
+            )
+
+    except Exception as e:
+
+        send_errors.inc(type(e).__name__)
+
+        logging.warning(
+            f"Send error: {e}"
+        )
+
+
+delivery_stage = Stage(
+    "delivery",
+    deliver,
+    SEND_WORKERS,
+    SEND_QUEUE_SIZE
+)
+
+# =========================================================
+# RANKING
+# =========================================================
+
+# Bounded min-heap of the best tokens seen so far in
+# a scan. Slots taken by early alerts shrink the heap.
+
+class TopK:
+
+    def __init__(self, k):
+
+        self.k = k
+
+        self.heap = []
+
+        self.count = 0
+
+    def take_slot(self):
+
+        if self.k <= 0:
+            return False
+
+        self.k -= 1
+
+        while len(self.heap) > self.k:
+            heapq.heappop(self.heap)
+
+        return True
+
+    def push(self, token):
+
+        if self.k <= 0:
+            return
+
+        # count breaks score ties without
+        # comparing the snapshots
+        self.count += 1
+
+        item = (
+            token.ai_score,
+            -self.count,
+            token
+        )
+
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, item)
+
+        elif item > self.heap[0]:
+            heapq.heapreplace(self.heap, item)
+
+    def best(self):
+
+        return [
+            token
+            for _, _, token in sorted(
+                self.heap,
+                reverse=True
+            )
+        ]
+
+# =========================================================
+# WATCHLIST MONITOR
+# =========================================================
+
+# Every tracked address is polled once per due cycle no
+# matter how many chats track it. Tokens that moved are
+# polled more often, quiet ones back off.
+
+WATCH_TICK = 15
+
+WATCH_MIN_INTERVAL = 30
+
+WATCH_MAX_INTERVAL = 300
+
+WATCH_PRICE_MOVE = 0.20
+
+WATCH_LIQUIDITY_MOVE = 0.30
+
+
+class WatchState:
+
+    __slots__ = (
+        "next_poll",
+        "interval",
+        "last"
+    )
+
+    def __init__(self):
+
+        self.next_poll = 0.0
+
+        self.interval = WATCH_MIN_INTERVAL
+
+        self.last = None
+
+
+watch_state = {}
+
+
+def relative_change(
+    old,
+    new
+):
+
+    return (new - old) / max(old, 1)
+
+
+def watch_changes(
+    address,
+    last,
+    token,
+    events
+):
+
+    lines = []
+
+    if "score_rising" in events:
+
+        history = previous_scores.get(address)
+
+        lines.append(
+            f"⚡ AI Score rising: "
+            f"{token.ai_score - history.score_delta:.2f} → "
+            f"{token.ai_score:.2f}"
+        )
+
+    if last is None:
+        return lines, 0.0
+
+    price_move = relative_change(
+        last.market_cap,
+        token.market_cap
+    )
+
+    liquidity_move = relative_change(
+        last.liquidity,
+        token.liquidity
+    )
+
+    if abs(price_move) >= WATCH_PRICE_MOVE:
+
+        lines.append(
+            f"💰 MC {price_move:+.0%}: "
+            f"${last.market_cap:,.0f} → "
+            f"${token.market_cap:,.0f}"
+        )
+
+    if (
+        "liquidity_pulled" in events
+        or abs(liquidity_move)
+        >= WATCH_LIQUIDITY_MOVE
+    ):
+
+        lines.append(
+            f"💧 Liquidity {liquidity_move:+.0%}: "
+            f"${last.liquidity:,.0f} → "
+            f"${token.liquidity:,.0f}"
+        )
+
+    old_risk = risk_level(
+        last.rug_risk
+    )
+
+    new_risk = risk_level(
+        token.rug_risk
+    )
+
+    if old_risk != new_risk:
+
+        lines.append(
+            f"⚠ Rug Risk: "
+            f"{old_risk} → {new_risk}"
+        )
+
+    move = max(
+        abs(price_move),
+        abs(liquidity_move)
+    )
+
+    return lines, move
+
+
+def reschedule(
+    state,
+    move,
+    now
+):
+
+    if move >= WATCH_PRICE_MOVE / 2:
+
+        state.interval = max(
+            WATCH_MIN_INTERVAL,
+            state.interval / 2
+        )
+
+    else:
+
+        state.interval = min(
+            WATCH_MAX_INTERVAL,
+            state.interval * 1.5
+        )
+
+    state.next_poll = now + state.interval
+
+
+async def poll_watchlist():
+
+    now = time.time()
+
+    for address in list(watch_state):
+
+        if address not in trackers:
+            del watch_state[address]
+
+    due = []
+
+    for address in trackers:
+
+        state = watch_state.setdefault(
+            address,
+            WatchState()
+        )
+
+        if state.next_poll <= now:
+            due.append(address)
+
+    if not due:
+        return
+
+    # join fetches already in flight for the scanner,
+    # register flights for the rest
+
+    shared = {}
+
+    own = []
+
+    own_flights = {}
+
+    try:
+
+        for address in due:
+
+            flight = inflight.get(address)
+
+            if flight is not None:
+                shared[address] = flight
+
+            else:
+
+                own_flights[address] = begin_flight(
+                    address
+                )
+
+                own.append(address)
+
+        batches = await asyncio.gather(
+            *[
+                fetch_pairs(
+                    http_session,
+                    chunk
+                )
+                for chunk in chunked(
+                    own,
+                    DEX_BATCH_SIZE
+                )
+            ]
+        )
+
+        fetched = {}
+
+        for chunk, pairs_by_token in zip(
+            chunked(own, DEX_BATCH_SIZE),
+            batches
+        ):
+
+            for address in chunk:
+
+                analyzed = None
+
+                if pairs_by_token not in (
+                    None,
+                    RATE_LIMITED
+                ):
+
+                    pairs = fetched[address] = (
+                        pairs_by_token.get(
+                            address,
+                            []
+                        )
+                    )
+
+                    # history is recorded below, with
+                    # the unfiltered measurement
+                    analyzed = await store_verdict(
+                        address,
+                        pairs,
+                        evaluate_token(pairs),
+                        notify=False
+                    )
+
+                end_flight(address, analyzed)
+
+    finally:
+
+        # a cancelled or failed poll must not leave
+        # scans attached to flights nobody resolves
+        for address, flight in own_flights.items():
+
+            if inflight.get(address) is flight:
+                end_flight(address, None)
+
+    await asyncio.gather(
+        *[
+            asyncio.shield(flight)
+            for flight in shared.values()
+        ],
+        return_exceptions=True
+    )
+
+    for address in shared:
+
+        # the scanner cached the pairs and already
+        # recorded this update in the history
+        pairs = await get_cached_pairs(address)
+
+        if pairs is not None:
+            fetched[address] = pairs
+
+    for address in due:
+
+        state = watch_state.get(address)
+
+        if state is None or address not in fetched:
+            continue
+
+        pairs = fetched[address]
+
+        token = measure_token(pairs)
+
+        if token is None:
+
+            reschedule(state, 0.0, now)
+
+            continue
+
+        events = (
+            [] if address in shared
+            else record_history(address, token)
+        )
+
+        lines, move = watch_changes(
+            address,
+            state.last,
+            token,
+            events
+        )
+
+        state.last = token
+
+        reschedule(state, move, now)
+
+        if not lines:
+            continue
+
+        payload = AlertPayload(
+            (
+                f"⭐ {token.name} "
+                f"({token.symbol})\n\n"
+                + "\n".join(lines)
+                + f"\n\n🔗 {token.url}"
+            ),
+            None
+        )
+
+        for chat_id in trackers.get(
+            address,
+            ()
+        ):
+
+            queue_message(
+                chat_id,
+                payload
+            )
+
+
+async def watch_loop():
+
+    while True:
+
+        await asyncio.sleep(
+            WATCH_TICK
+        )
+
+        try:
+
+            await poll_watchlist()
+
+        except Exception as e:
+
+            logging.warning(
+                f"Watchlist error: {e}"
+            )
+
+# =========================================================
+# ALERT LOOP
+# =========================================================
+
+def notify_momentum(
+    address,
+    token
+):
+
+    events = record_history(
+        address,
+        token
+    )
+
+    chat_ids = trackers.get(address)
+
+    if not events or not chat_ids:
+        return
+
+    history = previous_scores.get(address)
+
+    for event in events:
+
+        payload = AlertPayload(
+            format_momentum(
+                token,
+                event,
+                history
+            ),
+            None
+        )
+
+        for chat_id in chat_ids:
+
+            queue_message(
+                chat_id,
+                payload
+            )
+
+
+def send_alert(
+    token,
+    matcher
+):
+
+    if not should_send_alert(
+        token.address
+    ):
+        return
+
+    payload = build_payload(token)
+
+    for user_id in matcher.match(
+        token
+    ):
+
+        queue_message(
+            user_id,
+            payload
+        )
+
+
+def alert_handler(
+    matcher,
+    ranker=None
+):
+
+    # without a ranker only strong tokens alert;
+    # the rest wait for the next scan's ranking
+
+    def on_result(token):
+
+        if alert_sent(token.address):
+            return
+
+        # strong tokens go out without waiting
+        # for the rest of the scan
+        if (
+            token.ai_score
+            >= EARLY_ALERT_SCORE
+            and (
+                ranker is None
+                or ranker.take_slot()
+            )
+        ):
+
+            send_alert(
+                token,
+                matcher
+            )
+
+            return
+
+        if ranker is not None:
+            ranker.push(token)
+
+    return on_result
+
+
+async def run_scan():
+
+    # one full cycle: discover, score, alert
+
+    global user_count
+
+    users = await get_users()
+
+    user_count = len(users)
+
+    set_filter_bounds(users)
+
+    matcher = UserMatcher(users)
+
+    ranker = TopK(
+        MAX_TOP_RESULTS
+    )
+
+    start = time.perf_counter()
+
+    await scan_tokens(
+        alert_handler(
+            matcher,
+            ranker
+        )
+    )
+
+    scan_duration.observe(
+        time.perf_counter() - start
+    )
+
+    for token in ranker.best():
+
+        send_alert(
+            token,
+            matcher
+        )
+
+    await flush_sent_alerts()
+
+    logging.info(
+        "Pipeline: " + ", ".join(
+            f"{name} "
+            f"depth={st['depth']} "
+            f"wait={st['avg_wait_ms']:.0f}ms "
+            f"busy={st['avg_busy_ms']:.0f}ms"
+            for name, st in (
+                pipeline_stats().items()
+            )
+        )
+    )
+
+
+async def alert_loop():
+
+    while True:
+
+        logging.info(
+            "Running scan..."
+        )
+
+        try:
+
+            await run_scan()
+
+        except Exception as e:
+
+            logging.warning(
+                f"Scanner error: {e}"
+            )
+
+        interval = scan_scheduler.next_interval()
+
+        logging.info(
+            f"Sleeping "
+            f"{interval:.0f}s"
+        )
+
+        await asyncio.sleep(
+            interval
+        )
+
+# =========================================================
+# METRICS ENDPOINT
+# =========================================================
+
+# The profiler samples from a helper thread, so the
+# loop keeps serving while it runs.
+# PROFILER_ENABLED=1 adds /profile?seconds=N, which
+# samples the event loop thread and returns collapsed
+# stacks for flamegraph tools.
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED") == "1"
+
+PROFILE_SAMPLE_INTERVAL = 0.01
+
+PROFILE_MAX_SECONDS = 60
+
+loop_thread = None
+
+
+def render_samples(
+    name,
+    help,
+    samples,
+    kind="gauge"
+):
+
+    lines = [
+        f"# HELP {name} {help}",
+        f"# TYPE {name} {kind}"
+    ]
+
+    for labels, value in samples:
+
+        lines.append(
+            f"{name}{labels} {value}"
+        )
+
+    return lines
+
+
+def render_metrics():
+
+    lines = []
+
+    for metric in (
+        scan_duration,
+        fetch_latency,
+        analyze_time,
+        send_latency,
+        filter_rejects,
+        fetch_errors,
+        send_errors
+    ):
+        lines.extend(metric.render())
+
+    caches = {
+        "token": token_cache,
+        "raw": raw_cache,
+        "reject": reject_cache,
+        "history": previous_scores,
+        "sent": sent_alerts,
+        "stream": stream_candidates,
+        "chat_bucket": chat_buckets
+    }
+
+    lines.append(
+        "# HELP sniper_cache_requests_total "
+        "Cache lookups by result"
+    )
+
+    lines.append(
+        "# TYPE sniper_cache_requests_total counter"
+    )
+
+    for name, cache in caches.items():
+
+        for result in ("hits", "misses"):
+
+            lines.append(
+                f"sniper_cache_requests_total"
+                f'{{cache="{name}",result="{result}"}} '
+                f"{getattr(cache, result)}"
+            )
+
+    lines.append(
+        "# HELP sniper_api_responses_total "
+        "Dexscreener responses by endpoint and status"
+    )
+
+    lines.append(
+        "# TYPE sniper_api_responses_total counter"
+    )
+
+    for endpoint, budget in list(
+        api_budgets.items()
+    ):
+
+        for status, n in list(
+            budget.statuses.items()
+        ):
+
+            lines.append(
+                f"sniper_api_responses_total"
+                f'{{endpoint="{endpoint}",'
+                f'status="{status}"}} {n}'
+            )
+
+    stages = (
+        enrichment_stage,
+        scoring_stage,
+        delivery_stage
+    )
+
+    lines.extend(render_samples(
+        "sniper_queue_depth",
+        "Items waiting in each pipeline stage",
+        [
+            (f'{{stage="{st.name}"}}', st.queue.qsize())
+            for st in stages
+        ]
+    ))
+
+    lines.extend(render_samples(
+        "sniper_queue_dropped_total",
+        "Items dropped by full pipeline stages",
+        [
+            (f'{{stage="{st.name}"}}', st.dropped)
+            for st in stages
+        ],
+        "counter"
+    ))
+
+    lines.extend(render_samples(
+        "sniper_cache_size",
+        "Live entries per cache",
+        [
+            (f'{{cache="{name}"}}', len(cache.entries))
+            for name, cache in caches.items()
+        ]
+    ))
+
+    for name, help, value in (
+        (
+            "sniper_users",
+            "Registered users",
+            user_count
+        ),
+        (
+            "sniper_inflight_fetches",
+            "Addresses being fetched",
+            len(inflight)
+        ),
+        (
+            "sniper_tracked_tokens",
+            "Tokens on any watchlist",
+            len(trackers)
+        ),
+        (
+            "sniper_scan_interval_seconds",
+            "Current pause between scans",
+            scan_scheduler.interval
+        )
+    ):
+        lines.extend(render_samples(
+            name,
+            help,
+            [("", value)]
+        ))
+
+    return "\n".join(lines) + "\n"
+
+
+async def home(request):
+
+    return web.Response(
+        text="BOT RUNNING"
+    )
+
+
+async def metrics(request):
+
+    return web.Response(
+        body=render_metrics().encode(),
+        headers={
+            "Content-Type": (
+                "text/plain; version=0.0.4; "
+                "charset=utf-8"
+            )
+        }
+    )
+
+
+def sample_stacks(seconds):
+
+    stacks = {}
+
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+
+        frame = sys._current_frames().get(
+            loop_thread
+        )
+
+        names = []
+
+        while frame is not None:
+
+            code = frame.f_code
+
+            names.append(
+                f"{code.co_name} "
+                f"({os.path.basename(code.co_filename)}"
+                f":{frame.f_lineno})"
+            )
+
+            frame = frame.f_back
+
+        if names:
+
+            key = ";".join(reversed(names))
+
+            stacks[key] = stacks.get(key, 0) + 1
+
+        time.sleep(PROFILE_SAMPLE_INTERVAL)
+
+    return stacks
+
+
+async def profile(request):
+
+    if not PROFILER_ENABLED or loop_thread is None:
+
+        return web.Response(
+            status=404,
+            text="profiler disabled"
+        )
+
+    seconds = min(
+        safe_float(
+            request.query.get("seconds", 10)
+        ),
+        PROFILE_MAX_SECONDS
+    )
+
+    stacks = await asyncio.to_thread(
+        sample_stacks,
+        seconds
+    )
+
+    return web.Response(
+        text="".join(
+            f"{key} {n}\n"
+            for key, n in sorted(
+                stacks.items(),
+                key=lambda item: -item[1]
+            )
+        )
+    )
+
+# =========================================================
+# WEB SERVER
+# =========================================================
+
+# One aiohttp server on the bot's event loop serves
+# health, metrics and, in webhook mode, Telegram updates.
+
+async def start_web_server():
+
+    app = web.Application()
+
+    app.router.add_get("/", home)
+
+    app.router.add_get("/metrics", metrics)
+
+    app.router.add_get("/profile", profile)
+
+    if WEBHOOK_URL:
+
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            secret_token=WEBHOOK_SECRET
+        ).register(
+            app,
+            path=WEBHOOK_PATH
+        )
+
+        setup_application(
+            app,
+            dp,
+            bot=bot
+        )
+
+    runner = web.AppRunner(
+        app,
+        access_log=None
+    )
+
+    await runner.setup()
+
+    await web.TCPSite(
+        runner,
+        "0.0.0.0",
+        PORT
+    ).start()
+
+    return runner
+
+# =========================================================
+# PROCESS MODE
+# =========================================================
+
+# ANALYSIS_PROCESSES > 0 moves JSON parsing and scoring
+# of fetched batches into a process pool. DELIVERY_PROCESSES
+# > 0 sends alerts from separate processes, sharded by
+# chat_id so each chat keeps a single rate limit. This
+# process stays the coordinator: discovery, dedup,
+# ranking and Telegram updates.
+
+ANALYSIS_PROCESSES = int(
+    os.getenv("ANALYSIS_PROCESSES", 0)
+)
+
+DELIVERY_PROCESSES = int(
+    os.getenv("DELIVERY_PROCESSES", 0)
+)
+
+SHARD_METRICS_INTERVAL = 5
+
+analysis_pool = None
+
+delivery_queues = []
+
+delivery_processes = []
+
+# send metrics reported by the delivery processes
+shard_metrics = None
+
+
+def analyze_payload(
+    addresses,
+    body,
+    bounds
+):
+
+    # runs in an analysis process, so the bounds
+    # travel with the call
+    pairs_by_token = decode_pairs(body)
+
+    return evaluate_batch(
+        [
+            pairs_by_token.get(
+                address,
+                []
+            )
+            for address in addresses
+        ],
+        bounds
+    )
+
+
+def start_analysis_pool():
+
+    global analysis_pool
+
+    analysis_pool = ProcessPoolExecutor(
+        ANALYSIS_PROCESSES,
+        mp_context=multiprocessing.get_context(
+            "spawn"
+        )
+    )
 
+    # one scoring worker per process keeps
+    # every process busy
+    scoring_stage.workers = max(
+        scoring_stage.workers,
+        ANALYSIS_PROCESSES
+    )
 
-@router.message(Command("watchlist"))
-async def watchlist_handler(
-    message: Message
-):
 
-    tokens = await get_watchlist(
-        message.chat.id
+def start_delivery_processes():
+
+    global shard_metrics
+
+    context = multiprocessing.get_context(
+        "spawn"
     )
 
-    if not tokens:
+    shard_metrics = context.Queue()
 
-        await message.answer(
-            "📭 Empty watchlist"
+    for shard in range(DELIVERY_PROCESSES):
+
+        queue = context.Queue(
+            SEND_QUEUE_SIZE
         )
 
-        return
+        process = context.Process(
+            target=delivery_process,
+            args=(
+                queue,
+                DELIVERY_PROCESSES,
+                shard_metrics
+            ),
+            name=f"delivery-{shard}",
+            daemon=True
+        )
 
-    msg = "⭐ WATCHLIST\n\n"
+        process.start()
 
-    msg += "\n".join(tokens)
+        delivery_queues.append(queue)
 
-    await message.answer(msg)
-'''
-# =========================================================
-# ADMIN
-# =========================================================
+        delivery_processes.append(process)
 
-@router.message(Command("register"))
-async def register_handler(
-    message: Message
-):
 
-    if (
-        message.chat.id
-        != ADMIN_CHAT_ID
-    ):
-        return
+def offer_shard(job):
 
     try:
 
-        user_id = int(
-            message.text.split()[1]
-        )
+        delivery_queues[
+            job[0] % len(delivery_queues)
+        ].put_nowait(job)
 
-        await add_user(user_id)
+        return True
 
-        await message.answer(
-            f"✅ Registered {user_id}"
-        )
+    except Full:
 
-        await bot.send_message(
-            user_id,
-            (
-                "✅ You are now approved."
-            )
-        )
+        return False
 
-    except Exception:
 
-        await message.answer(
-            "Usage:\n/register USER_ID"
+def stop_processes():
+
+    for queue in delivery_queues:
+        queue.put(None)
+
+    for process in delivery_processes:
+        process.join(timeout=10)
+
+    # after the final reports, ends collect_shard_metrics
+    if shard_metrics:
+        shard_metrics.put(None)
+
+    if analysis_pool:
+
+        analysis_pool.shutdown(
+            cancel_futures=True
         )
 
-@router.message()
-async def ignore_text(
-    message: Message
+
+def delivery_process(
+    queue,
+    shards,
+    metrics
 ):
 
-    await message.answer(
-        (
-            "⚠ Please use the menu buttons.\n"
-            "Use '/help' to access buttons"
-        ),
-        #reply_markup=main_menu()
+    asyncio.run(
+        delivery_shard(
+            queue,
+            shards,
+            metrics
+        )
     )
-    
-# =========================================================
-# CALLBACKS
-# =========================================================
-
-@router.callback_query()
-async def callback_handler(
-    callback: CallbackQuery
-):
 
-    data = callback.data
 
-    if data.startswith("track:"):
+def report_shard_metrics(metrics):
 
-        token = data.split(
-            ":",
-            1
-        )[1]
+    # sends since the last report; the coordinator
+    # adds them to its own /metrics
+    latency = send_latency.take()
 
-        await track_token(
-            callback.from_user.id,
-            token
-        )
+    errors = send_errors.take()
 
-        await callback.message.answer(
-            "⭐ Added to watchlist"
-        )
+    if sum(latency[0]) or errors:
+        metrics.put((latency, errors))
 
-    elif data == "scanner":
 
-        await callback.message.answer(
-            "📊 Scanner running live"
-        )
+async def push_shard_metrics(metrics):
 
-    elif data == "watchlist":
+    while True:
 
-        tokens = await get_watchlist(
-            callback.from_user.id
+        await asyncio.sleep(
+            SHARD_METRICS_INTERVAL
         )
 
-        if tokens:
+        report_shard_metrics(metrics)
 
-            await callback.message.answer(
-                "\n".join(tokens)
-            )
 
-        else:
+async def collect_shard_metrics():
 
-            await callback.message.answer(
-                "📭 Empty watchlist"
-            )
+    loop = asyncio.get_running_loop()
 
-    elif data == "settings":
+    while True:
 
-        await callback.message.answer(
-            (
-                "⚙ Settings panel "
-                "coming soon"
-            )
+        report = await loop.run_in_executor(
+            None,
+            shard_metrics.get
         )
-        
-    elif data == "help":
 
-    	await callback.message.answer(
-        	(
-            	"🔥 AI Crypto Scanner Bot\n\n"
+        # None is the shutdown sentinel
+        if report is None:
+            return
 
-            	"Use the buttons below "
-            	"to navigate the bot."
-        	),
-        	reply_markup=main_menu()
-    	)
-        
-    elif data == "myid":
-        await callback.message.answer(
-        	f"🆔 {callback.from_user.id}"
-    	)
-    
-    elif data == "status":
-    	registered = await is_registered(
-    		callback.from_user.id
-    	)
-    	
-    	if registered:
-    		await callback.message.answer(
-    			"✅ Approved"
-    		)
-    		
-    	else:
-    		await callback.message.answer(
-    			(
-    				"❌ Not approved.\n\n"
-    				f"Send ID to {ADMIN_USERNAME} to get approved\n"
-    				"*Use the MyID button to retrieve chat id*"
-    				
-    			)
-    		
-    		)
-    
+        latency, errors = report
 
-    await callback.answer()
+        send_latency.merge(latency)
 
-# =========================================================
-# FETCH TOKEN
-# =========================================================
+        send_errors.merge(errors)
 
-DEX_URL = (
-    "https://api.dexscreener.com/"
-    "tokens/v1/solana/{}"
-)
 
-async def fetch_token(
-    session,
-    token_address
+async def delivery_shard(
+    queue,
+    shards,
+    metrics
 ):
 
-    cached = await get_cached_token(
-        token_address
+    global global_bucket
+
+    create_bot()
+
+    # the bot-wide send rate is split evenly
+    rate = GLOBAL_SEND_RATE / shards
+
+    global_bucket = TokenBucket(
+        rate,
+        max(rate, 1)
     )
 
-    if cached:
-        return cached
+    tasks = delivery_stage.start()
 
-    try:
+    tasks.append(
+        asyncio.create_task(
+            push_shard_metrics(metrics)
+        )
+    )
 
-        async with session.get(
-            DEX_URL.format(token_address)
-        ) as response:
+    loop = asyncio.get_running_loop()
 
-            if response.status != 200:
-                return None
+    try:
 
-            data = await response.json()
+        while True:
 
-            analyzed = analyze_token(
-                data
+            job = await loop.run_in_executor(
+                None,
+                queue.get
             )
 
-            if analyzed:
+            # None is the shutdown sentinel
+            if job is None:
+                break
 
-                await cache_token(
-                    token_address,
-                    analyzed
-                )
+            queue_message(*job)
 
-            return analyzed
+        await drain_delivery()
 
-    except Exception as e:
+    finally:
 
-        logging.warning(
-            f"Fetch error: {e}"
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(
+            *tasks,
+            return_exceptions=True
         )
 
-        return None
+        report_shard_metrics(metrics)
+
+        await bot.session.close()
 
 # =========================================================
-# CONCURRENT TOKEN SCANNER
+# MAIN
 # =========================================================
 
-async def scan_tokens():
-
-    client = DexscreenerClient()
-
-    profiles = await asyncio.to_thread(
-        client.get_latest_token_profiles
-    )
+async def main():
 
-    async with aiohttp.ClientSession() as session:
+    global SOLANA_WS_URL, SOLANA_RPC_URL, loop_thread
 
-        tasks = []
+    loop_thread = threading.get_ident()
 
-        for profile in profiles:
+    create_bot()
 
-            if not profile.token_address:
-                continue
+    print("BOT STARTED")
 
-            if (
-                profile.chain_id
-                != "solana"
-            ):
-                continue
+    await init_db()
 
-            task = asyncio.create_task(
-                fetch_token(
-                    session,
-                    profile.token_address
-                )
-            )
+    await load_sent_alerts()
 
-            tasks.append(task)
+    await load_trackers()
 
-        # MOBILE SAFE LIMIT
-        tasks = tasks[:25]
+    await open_http_session()
 
-        results = await asyncio.gather(
-            *tasks,
-            return_exceptions=True
-        )
+    if ANALYSIS_PROCESSES:
+        start_analysis_pool()
 
-    cleaned = []
+    collector = None
 
-    for result in results:
+    if DELIVERY_PROCESSES:
 
-        if isinstance(
-            result,
-            Exception
-        ):
-            continue
+        start_delivery_processes()
 
-        if result is not None:
-            cleaned.append(result)
+        collector = asyncio.create_task(
+            collect_shard_metrics()
+        )
 
-    return cleaned
+    tasks = [
+        asyncio.create_task(
+            alert_loop()
+        ),
+        asyncio.create_task(
+            cache_sweeper()
+        ),
+        asyncio.create_task(
+            watch_loop()
+        )
+    ]
 
-# =========================================================
-# ALERT LOOP
-# =========================================================
+    for stage in (
+        enrichment_stage,
+        scoring_stage,
+        delivery_stage
+    ):
+        tasks.extend(stage.start())
 
-async def alert_loop():
+    replay = None
 
-    while True:
+    if SOLANA_WS_REPLAY:
 
-        logging.info(
-            "Running scan..."
+        replay = await start_replay_server(
+            SOLANA_WS_REPLAY
         )
 
-        try:
-
-            results = await scan_tokens()
+        SOLANA_WS_URL = SOLANA_RPC_URL = (
+            f"http://127.0.0.1:"
+            f"{STREAM_REPLAY_PORT}/"
+        )
 
-            results = sorted(
-                results,
-                key=lambda x: (
-                    x["ai_score"]
-                ),
-                reverse=True
-            )[:MAX_TOP_RESULTS]
+    if SOLANA_WS_URL:
 
-            users = await get_users()
+        tasks.append(
+            asyncio.create_task(
+                stream_discovery()
+            )
+        )
 
-            for token in results:
+        tasks.append(
+            asyncio.create_task(
+                stream_loop()
+            )
+        )
 
-                address = (
-                    token["url"]
-                    .split("/")[-1]
-                    if token["url"]
-                    else token["symbol"]
-                )
+    server = await start_web_server()
 
-                if not should_send_alert(
-                    address
-                ):
-                    continue
+    try:
 
-                msg = format_alert(
-                    token
-                )
+        if WEBHOOK_URL:
 
-                for user_id in users:
+            await bot.set_webhook(
+                WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=(
+                    dp.resolve_used_update_types()
+                ),
+                drop_pending_updates=True
+            )
 
-                    try:
+            # updates arrive through the web server
+            await asyncio.Event().wait()
 
-                        await bot.send_message(
-                            user_id,
-                            msg,
-                            reply_markup=(
-                                token_keyboard(
-                                    address
-                                )
-                            )
-                        )
+        else:
 
-                    except Exception as e:
+            await bot.delete_webhook(
+                drop_pending_updates=True
+            )
 
-                        logging.warning(
-                            f"Send error: {e}"
-                        )
+            await dp.start_polling(bot)
 
-        except Exception as e:
+    finally:
 
-            logging.warning(
-                f"Scanner error: {e}"
-            )
+        for task in tasks:
+            task.cancel()
 
-        logging.info(
-            f"Sleeping "
-            f"{SCAN_INTERVAL}s"
+        await asyncio.gather(
+            *tasks,
+            return_exceptions=True
         )
 
-        await asyncio.sleep(
-            SCAN_INTERVAL
-        )
+        await server.cleanup()
 
-# =========================================================
-# MAIN
-# =========================================================
+        if replay:
+            await replay.cleanup()
 
-async def main():
+        await asyncio.to_thread(
+            stop_processes
+        )
 
-    await init_db()
+        if collector:
+            await collector
 
-    asyncio.create_task(
-        alert_loop()
-    )
+        await close_http_session()
 
-    await bot.delete_webhook(
-        drop_pending_updates=True
-    )
+        await flush_sent_alerts()
 
-    await dp.start_polling(bot)
+        await close_db()
 
 # =========================================================
 # ENTRY
@@ -1135,9 +5930,4 @@ async def main():
 
 if __name__ == "__main__":
 
-    threading.Thread(
-        target=start_flask,
-        daemon=True
-    ).start()
-
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,789 @@
+# =========================================================
+# SCANNER BENCHMARK
+# OFFLINE REPLAY OF ONE SCAN -> ANALYZE -> ALERT CYCLE
+# =========================================================
+
+# Serves recorded (or generated) Dexscreener feeds and
+# pairs from a local aiohttp stand-in, swaps the bot for
+# a recorder and runs one full scan with M users.
+#
+#   python benchmark.py --tokens 3000 --users 500
+#   python benchmark.py --latency 50 --error-rate 0.05
+#   python benchmark.py --tokens 20000 --processes 4
+#   python benchmark.py --tokens 50000 --snapshot-memory
+#   python benchmark.py --record fixtures.json
+#   python benchmark.py --fixtures fixtures.json
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import time
+import tracemalloc
+
+from aiohttp import web
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+
+os.environ.setdefault("ADMIN_CHAT_ID", "0")
+
+import automated_sniper_bot as sniper
+
+DEXSCREENER = "https://api.dexscreener.com"
+
+BENCH_HOST = "127.0.0.1"
+
+BENCH_PORT = 8877
+
+# =========================================================
+# FIXTURES
+# =========================================================
+
+def generate_fixtures(tokens, seed=1):
+
+    rng = random.Random(seed)
+
+    now = int(time.time() * 1000)
+
+    feeds = [[] for _ in sniper.DISCOVERY_FEEDS]
+
+    pairs = {}
+
+    for i in range(tokens):
+
+        address = f"Bench{i:06d}pump"
+
+        feeds[i % len(feeds)].append({
+            "chainId": "solana",
+            "tokenAddress": address
+        })
+
+        pairs[address] = [{
+            "chainId": "solana",
+            "url": (
+                "https://dexscreener.com/solana/"
+                + address
+            ),
+            "baseToken": {
+                "address": address,
+                "name": f"Bench {i}",
+                "symbol": f"B{i}"
+            },
+            "marketCap": rng.uniform(5e3, 3e6),
+            "liquidity": {
+                "usd": rng.uniform(2e3, 2e5)
+            },
+            "volume": {
+                "h24": rng.uniform(1e3, 5e5)
+            },
+            "priceChange": {
+                "h24": rng.uniform(-50, 300)
+            },
+            "txns": {
+                "h24": {
+                    "buys": rng.randint(0, 500),
+                    "sells": rng.randint(0, 500)
+                }
+            },
+            "pairCreatedAt": (
+                now
+                - rng.uniform(1, 120) * 60000
+            )
+        }]
+
+    return {
+        "recorded_at": now,
+        "feeds": feeds,
+        "pairs": pairs
+    }
+
+
+async def record_fixtures(path, tokens):
+
+    await sniper.open_http_session()
+
+    try:
+
+        feeds = await sniper.fetch_profiles(
+            sniper.http_session
+        )
+
+        addresses = list(dict.fromkeys(
+            profile.token_address
+            for feed in feeds
+            for profile in feed
+            if profile.chain_id == "solana"
+            and profile.token_address
+        ))[:tokens]
+
+        pairs = {}
+
+        for chunk in sniper.chunked(
+            addresses,
+            sniper.DEX_BATCH_SIZE
+        ):
+
+            # raw pair dicts; fetch_pairs would hand
+            # back Pair records the loaders can't read
+            status, data = await sniper.api_get(
+                sniper.http_session,
+                sniper.DEX_URL.format(
+                    ",".join(chunk)
+                )
+            )
+
+            if status != 200:
+                continue
+
+            for item in data or []:
+
+                try:
+                    address = item["baseToken"]["address"]
+
+                except (KeyError, TypeError):
+                    continue
+
+                pairs.setdefault(
+                    address,
+                    []
+                ).append(item)
+
+    finally:
+
+        await sniper.close_http_session()
+
+    fixtures = {
+        "recorded_at": int(time.time() * 1000),
+        "feeds": [
+            [
+                {
+                    "chainId": profile.chain_id,
+                    "tokenAddress": profile.token_address
+                }
+                for profile in feed
+            ]
+            for feed in feeds
+        ],
+        "pairs": pairs
+    }
+
+    with open(path, "w") as f:
+        json.dump(fixtures, f)
+
+    print(
+        f"Recorded {len(addresses)} tokens, "
+        f"{len(pairs)} with pairs -> {path}"
+    )
+
+
+def load_fixtures(path, tokens):
+
+    with open(path) as f:
+        fixtures = json.load(f)
+
+    # keep recorded ages relative to now
+    shift = (
+        int(time.time() * 1000)
+        - fixtures["recorded_at"]
+    )
+
+    for pairs in fixtures["pairs"].values():
+
+        for pair in pairs:
+
+            if pair.get("pairCreatedAt"):
+                pair["pairCreatedAt"] += shift
+
+    return scale_fixtures(fixtures, tokens)
+
+
+def scale_fixtures(fixtures, tokens):
+
+    # repeat recorded tokens under new addresses
+    # until there are enough of them
+
+    recorded = [
+        entry
+        for feed in fixtures["feeds"]
+        for entry in feed
+        if entry["tokenAddress"] in fixtures["pairs"]
+    ]
+
+    if not recorded or len(recorded) >= tokens:
+        return fixtures
+
+    feeds = [[] for _ in fixtures["feeds"]]
+
+    pairs = {}
+
+    for i in range(tokens):
+
+        entry = recorded[i % len(recorded)]
+
+        source = entry["tokenAddress"]
+
+        address = (
+            source if i < len(recorded)
+            else f"{source}-{i}"
+        )
+
+        feeds[i % len(feeds)].append({
+            "chainId": "solana",
+            "tokenAddress": address
+        })
+
+        pairs[address] = [
+            {
+                **pair,
+                "baseToken": {
+                    **pair["baseToken"],
+                    "address": address
+                }
+            }
+            for pair in fixtures["pairs"][source]
+        ]
+
+    return {
+        "recorded_at": fixtures["recorded_at"],
+        "feeds": feeds,
+        "pairs": pairs
+    }
+
+# =========================================================
+# DEXSCREENER STAND-IN
+# =========================================================
+
+class StandIn:
+
+    def __init__(
+        self,
+        fixtures,
+        latency,
+        error_rate
+    ):
+
+        self.fixtures = fixtures
+
+        self.latency = latency
+
+        self.error_rate = error_rate
+
+        self.rng = random.Random(2)
+
+        self.detected = {}
+
+        self.requests = 0
+
+        self.throttled = 0
+
+        self.runner = None
+
+    async def delay(self):
+
+        self.requests += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.rng.random() < self.error_rate:
+
+            self.throttled += 1
+
+            return web.Response(
+                status=429,
+                headers={"Retry-After": "1"}
+            )
+
+        return None
+
+    def feed_handler(self, index):
+
+        async def handler(request):
+
+            throttled = await self.delay()
+
+            if throttled is not None:
+                return throttled
+
+            now = time.monotonic()
+
+            feed = self.fixtures["feeds"][index]
+
+            for entry in feed:
+
+                self.detected.setdefault(
+                    entry["tokenAddress"],
+                    now
+                )
+
+            return web.json_response(feed)
+
+        return handler
+
+    async def pairs_handler(self, request):
+
+        throttled = await self.delay()
+
+        if throttled is not None:
+            return throttled
+
+        pairs = self.fixtures["pairs"]
+
+        return web.json_response([
+            pair
+            for address in (
+                request.match_info["addresses"]
+                .split(",")
+            )
+            for pair in pairs.get(address, ())
+        ])
+
+    async def start(self):
+
+        app = web.Application()
+
+        for index, url in enumerate(
+            sniper.DISCOVERY_FEEDS
+        ):
+
+            app.router.add_get(
+                url[len(DEXSCREENER):],
+                self.feed_handler(index)
+            )
+
+        app.router.add_get(
+            "/tokens/v1/solana/{addresses}",
+            self.pairs_handler
+        )
+
+        self.runner = web.AppRunner(
+            app,
+            access_log=None
+        )
+
+        await self.runner.setup()
+
+        await web.TCPSite(
+            self.runner,
+            BENCH_HOST,
+            BENCH_PORT
+        ).start()
+
+        base = f"http://{BENCH_HOST}:{BENCH_PORT}"
+
+        sniper.DISCOVERY_FEEDS = tuple(
+            url.replace(DEXSCREENER, base)
+            for url in sniper.DISCOVERY_FEEDS
+        )
+
+        sniper.DEX_URL = sniper.DEX_URL.replace(
+            DEXSCREENER,
+            base
+        )
+
+    async def stop(self):
+
+        await self.runner.cleanup()
+
+# =========================================================
+# FAKE BOT
+# =========================================================
+
+class RecordingBot:
+
+    def __init__(self, latency):
+
+        self.latency = latency
+
+        self.sent = []
+
+    async def send_message(
+        self,
+        chat_id,
+        text,
+        reply_markup=None,
+        **kwargs
+    ):
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        # track:<address> on the first button
+        address = (
+            reply_markup.inline_keyboard[0][0]
+            .callback_data.split(":", 1)[1]
+        )
+
+        self.sent.append((
+            chat_id,
+            address,
+            time.monotonic()
+        ))
+
+# =========================================================
+# BENCHMARK
+# =========================================================
+
+def percentile(values, q):
+
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+
+    return ordered[
+        min(
+            int(q * len(ordered)),
+            len(ordered) - 1
+        )
+    ]
+
+
+def lift_limits():
+
+    # measure our own code, not the upstream quotas
+    unlimited = 1e9
+
+    for endpoint in sniper.API_RATE_LIMITS:
+        sniper.API_RATE_LIMITS[endpoint] = unlimited
+
+    sniper.global_bucket = sniper.TokenBucket(
+        unlimited,
+        unlimited
+    )
+
+    sniper.CHAT_SEND_RATE = unlimited
+
+    sniper.CHAT_SEND_BURST = unlimited
+
+
+async def benchmark(args):
+
+    if args.fixtures:
+
+        fixtures = load_fixtures(
+            args.fixtures,
+            args.tokens
+        )
+
+    else:
+
+        fixtures = generate_fixtures(args.tokens)
+
+    tokens = len(fixtures["pairs"])
+
+    if not args.real_limits:
+        lift_limits()
+
+    sniper.SCAN_BUDGET = tokens
+
+    sniper.MAX_TOP_RESULTS = args.top
+
+    sniper.DB_FILE = ":memory:"
+
+    stand_in = StandIn(
+        fixtures,
+        args.latency / 1000,
+        args.error_rate
+    )
+
+    recorder = sniper.bot = RecordingBot(
+        args.send_latency / 1000
+    )
+
+    await stand_in.start()
+
+    await sniper.init_db()
+
+    await asyncio.gather(*[
+        sniper.add_user(chat_id)
+        for chat_id in range(1, args.users + 1)
+    ])
+
+    await sniper.open_http_session()
+
+    if args.processes:
+
+        sniper.ANALYSIS_PROCESSES = args.processes
+
+        sniper.start_analysis_pool()
+
+        # spawn and import in the workers up front
+        loop = asyncio.get_running_loop()
+
+        await asyncio.gather(*[
+            loop.run_in_executor(
+                sniper.analysis_pool,
+                os.getpid
+            )
+            for _ in range(args.processes)
+        ])
+
+    tasks = []
+
+    for stage in (
+        sniper.enrichment_stage,
+        sniper.scoring_stage,
+        sniper.delivery_stage
+    ):
+        tasks.extend(stage.start())
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    try:
+
+        start = time.monotonic()
+
+        await sniper.run_scan()
+
+        await sniper.drain_delivery()
+
+        elapsed = time.monotonic() - start
+
+    finally:
+
+        if args.tracemalloc:
+
+            _, traced_peak = tracemalloc.get_traced_memory()
+
+            tracemalloc.stop()
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(
+            *tasks,
+            return_exceptions=True
+        )
+
+        sniper.stop_processes()
+
+        await sniper.close_http_session()
+
+        await sniper.close_db()
+
+        await stand_in.stop()
+
+    latencies = [
+        sent_at - stand_in.detected[address]
+        for _, address, sent_at in recorder.sent
+        if address in stand_in.detected
+    ]
+
+    scored = sniper.scoring_stage.processed
+
+    print(
+        f"tokens={tokens} users={args.users} "
+        f"processes={args.processes} "
+        f"latency={args.latency:.0f}ms "
+        f"error_rate={args.error_rate}"
+    )
+
+    print(
+        f"scan: {elapsed:.3f}s, "
+        f"{tokens / elapsed:,.0f} tokens/s, "
+        f"{stand_in.requests} requests, "
+        f"{stand_in.throttled} throttled, "
+        f"{scored} batches scored"
+    )
+
+    print(
+        f"alerts: {len(recorder.sent)} sent, "
+        f"detection->alert "
+        f"p50={percentile(latencies, 0.5) * 1000:.1f}ms "
+        f"p99={percentile(latencies, 0.99) * 1000:.1f}ms"
+    )
+
+    memory = (
+        f"memory: peak rss "
+        f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}MB"
+    )
+
+    if args.tracemalloc:
+        memory += (
+            f", traced peak "
+            f"{traced_peak / 1024 / 1024:.1f}MB"
+        )
+
+    print(memory)
+
+
+def traced_size(build):
+
+    tracemalloc.start()
+
+    try:
+
+        objects = build()
+
+        return (
+            tracemalloc.get_traced_memory()[0],
+            len(objects)
+        )
+
+    finally:
+
+        tracemalloc.stop()
+
+
+def snapshot_memory(tokens):
+
+    # per-token footprint of a TokenSnapshot against
+    # the dict the analytics used to return
+
+    fixtures = generate_fixtures(tokens)
+
+    snapshots = [
+        verdict[0]
+        for verdict in sniper.evaluate_batch([
+            sniper.group_pairs(pairs)[address]
+            for address, pairs in (
+                fixtures["pairs"].items()
+            )
+        ])
+        if verdict[0]
+    ]
+
+    # the values themselves are shared, only the
+    # containers are measured
+    as_dict, count = traced_size(
+        lambda: [
+            dict(zip(
+                snapshot._fields[1:],
+                snapshot[1:]
+            ))
+            for snapshot in snapshots
+        ]
+    )
+
+    as_snapshot, _ = traced_size(
+        lambda: [
+            sniper.TokenSnapshot(*snapshot)
+            for snapshot in snapshots
+        ]
+    )
+
+    print(f"tokens={count}")
+
+    print(
+        f"dict: {as_dict / count:.0f} B/token, "
+        f"TokenSnapshot: {as_snapshot / count:.0f} B/token, "
+        f"saving {1 - as_snapshot / as_dict:.0%}"
+    )
+
+
+def parse_args():
+
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark of one scan cycle"
+    )
+
+    parser.add_argument(
+        "--tokens",
+        type=int,
+        default=1000,
+        help="candidate tokens served by the feeds"
+    )
+
+    parser.add_argument(
+        "--users",
+        type=int,
+        default=100,
+        help="registered users receiving alerts"
+    )
+
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=sniper.MAX_TOP_RESULTS,
+        help="alerts per scan (MAX_TOP_RESULTS)"
+    )
+
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0,
+        help="stand-in response latency (ms)"
+    )
+
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="fraction of requests answered with 429"
+    )
+
+    parser.add_argument(
+        "--send-latency",
+        type=float,
+        default=0,
+        help="fake Telegram send latency (ms)"
+    )
+
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=0,
+        help="analysis processes (ANALYSIS_PROCESSES)"
+    )
+
+    parser.add_argument(
+        "--real-limits",
+        action="store_true",
+        help="keep the Dexscreener and Telegram rate limits"
+    )
+
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="also report the traced Python heap peak"
+    )
+
+    parser.add_argument(
+        "--snapshot-memory",
+        action="store_true",
+        help="compare per-token memory of TokenSnapshot and dict"
+    )
+
+    parser.add_argument(
+        "--fixtures",
+        help="replay a recorded fixtures file"
+    )
+
+    parser.add_argument(
+        "--record",
+        help="record live feeds and pairs to this file"
+    )
+
+    return parser.parse_args()
+
+# =========================================================
+# ENTRY
+# =========================================================
+
+if __name__ == "__main__":
+
+    args = parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.snapshot_memory:
+
+        snapshot_memory(args.tokens)
+
+    elif args.record:
+
+        asyncio.run(
+            record_fixtures(
+                args.record,
+                args.tokens
+            )
+        )
+
+    else:
+
+        asyncio.run(benchmark(args))
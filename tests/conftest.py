@@ -0,0 +1,123 @@
+# =========================================================
+# SHARED TEST SETUP
+# =========================================================
+
+# The bot reads its settings at import time, so the
+# environment is set before any test module imports it.
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+
+os.environ.setdefault("ADMIN_CHAT_ID", "0")
+
+sys.path.insert(
+    0,
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+import automated_sniper_bot as sniper
+
+
+def build_pair(
+    address,
+    market_cap=50000,
+    liquidity=20000,
+    volume=10000,
+    price_change=12,
+    age_minutes=20
+):
+
+    # one Dexscreener pair dict that passes the
+    # default filters unless told otherwise
+
+    return {
+        "baseToken": {
+            "address": address,
+            "name": address,
+            "symbol": address[:3]
+        },
+        "url": "https://dexscreener.com/solana/" + address,
+        "marketCap": market_cap,
+        "liquidity": {"usd": liquidity},
+        "volume": {"h24": volume},
+        "priceChange": {"h24": price_change},
+        "txns": {"h24": {"buys": 30, "sells": 10}},
+        "pairCreatedAt": (
+            int(time.time() * 1000)
+            - age_minutes * 60000
+        )
+    }
+
+
+@pytest.fixture
+def make_pair():
+
+    return build_pair
+
+
+@pytest.fixture
+def make_pairs():
+
+    # decoded, as evaluate_token takes them
+    def make(address, **kwargs):
+
+        return [sniper.decode_pair(
+            build_pair(address, **kwargs)
+        )]
+
+    return make
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+
+    # caches and queues are module globals; start and
+    # leave every test with them empty
+
+    def clear():
+
+        # asyncio queues bind to the first loop that
+        # waits on them, and each test runs its own
+        sniper.db_queue = asyncio.Queue()
+
+        for stage in (
+            sniper.enrichment_stage,
+            sniper.scoring_stage,
+            sniper.delivery_stage
+        ):
+            stage.queue = asyncio.Queue(
+                maxsize=stage.queue.maxsize
+            )
+
+        for cache in (
+            sniper.token_cache,
+            sniper.raw_cache,
+            sniper.reject_cache,
+            sniper.previous_scores,
+            sniper.sent_alerts,
+            sniper.stream_candidates,
+            sniper.chat_buckets
+        ):
+            cache.entries.clear()
+
+        for state in (
+            sniper.pending_alerts,
+            sniper.stream_pending,
+            sniper.inflight,
+            sniper.last_signatures,
+            sniper.trackers,
+            sniper.chat_backlogs
+        ):
+            state.clear()
+
+    clear()
+
+    yield
+
+    clear()
@@ -0,0 +1,167 @@
+# =========================================================
+# BATCH ANALYTICS PARITY
+# =========================================================
+
+# evaluate_batch must return exactly what evaluate_token
+# returns for every payload, filters and errors included.
+
+import random
+import time
+import warnings
+
+import pytest
+
+import automated_sniper_bot as sniper
+
+FUZZ_ITEMS = 20000
+
+
+def random_pair(rng, now):
+
+    def pick(*choices):
+        return rng.choice(choices)
+
+    return {
+        "baseToken": pick(
+            {
+                "address": f"Fuzz{rng.randrange(10 ** 6)}",
+                "name": "n",
+                "symbol": "s"
+            },
+            {"address": "Fuzz"},
+            "broken"
+        ),
+        "url": "u",
+        "marketCap": pick(
+            rng.uniform(0, 3e6),
+            rng.uniform(1e4, 2e6),
+            str(rng.uniform(1e4, 2e6)),
+            15000,
+            -1,
+            None,
+            "abc",
+            "nan",
+            "inf"
+        ),
+        "liquidity": pick(
+            {"usd": rng.uniform(0, 1e5)},
+            {"usd": pick(4000, 8000, None, "inf")},
+            None
+        ),
+        "volume": pick(
+            {"h24": rng.uniform(0, 1e5)},
+            {"h24": pick(3000, None, "inf")},
+            {}
+        ),
+        "priceChange": {
+            "h24": pick(
+                rng.uniform(-90, 900),
+                None,
+                "x",
+                "nan",
+                "-inf"
+            )
+        },
+        "txns": {
+            "h24": {
+                "buys": pick(rng.randint(0, 500), None, "inf"),
+                "sells": pick(rng.randint(0, 500), None, -1)
+            }
+        },
+        "pairCreatedAt": pick(
+            now - rng.randint(0, 200) * 60000,
+            now // 1000 - rng.randint(0, 200) * 60,
+            now - 5 * 60000,
+            now - 100 * 60000,
+            None,
+            "bad"
+        )
+    }
+
+
+def random_items(count, seed=7):
+
+    rng = random.Random(seed)
+
+    now = int(time.time() * 1000)
+
+    items = []
+
+    for _ in range(count):
+
+        if rng.random() < 0.05:
+
+            items.append([])
+
+            continue
+
+        pairs = []
+
+        for _ in range(rng.choice((1, 1, 1, 2))):
+
+            try:
+                pairs.append(
+                    sniper.decode_pair(
+                        random_pair(rng, now)
+                    )
+                )
+
+            except (AttributeError, TypeError):
+                pass
+
+        items.append(pairs)
+
+    return items
+
+
+def scalar(items):
+
+    return [
+        sniper.evaluate_token(item)
+        for item in items
+    ]
+
+
+@pytest.mark.parametrize(
+    "bounds",
+    [
+        sniper.DEFAULT_FILTER_BOUNDS,
+        sniper.FilterBounds(0, float("inf"), 0),
+        sniper.FilterBounds(50000, 500000, 20000)
+    ]
+)
+def test_batch_matches_scalar(bounds, monkeypatch):
+
+    monkeypatch.setattr(sniper, "filter_bounds", bounds)
+
+    items = random_items(FUZZ_ITEMS)
+
+    expected = scalar(items)
+
+    # repr so nan scores compare equal
+    assert [
+        repr(result)
+        for result in sniper.evaluate_batch(items, bounds)
+    ] == [
+        repr(result)
+        for result in expected
+    ]
+
+    # the fuzz must exercise both outcomes
+    assert any(result[0] for result in expected)
+
+    assert any(result[1] for result in expected)
+
+
+def test_batch_without_runtime_warnings():
+
+    items = random_items(2000, seed=11)
+
+    with warnings.catch_warnings():
+
+        warnings.simplefilter(
+            "error",
+            RuntimeWarning
+        )
+
+        sniper.evaluate_batch(items)
@@ -0,0 +1,184 @@
+# =========================================================
+# DELIVERY
+# =========================================================
+
+# A burst to one chat waits on that chat's bucket
+# without holding the send workers other chats need.
+
+import asyncio
+import queue
+import time
+
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+import automated_sniper_bot as sniper
+
+
+async def deliver_all(jobs, send_message, monkeypatch):
+
+    monkeypatch.setattr(
+        sniper,
+        "bot",
+        SimpleNamespace(send_message=send_message)
+    )
+
+    monkeypatch.setattr(
+        sniper,
+        "global_bucket",
+        sniper.TokenBucket(
+            sniper.GLOBAL_SEND_RATE,
+            sniper.GLOBAL_SEND_RATE
+        )
+    )
+
+    tasks = sniper.delivery_stage.start()
+
+    try:
+
+        for chat_id, text in jobs:
+
+            sniper.queue_message(
+                chat_id,
+                sniper.AlertPayload(text, None)
+            )
+
+        await asyncio.wait_for(
+            sniper.drain_delivery(),
+            10
+        )
+
+    finally:
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(
+            *tasks,
+            return_exceptions=True
+        )
+
+
+def test_burst_does_not_block_other_chats(monkeypatch):
+
+    monkeypatch.setattr(sniper, "CHAT_SEND_RATE", 20)
+
+    monkeypatch.setattr(sniper, "CHAT_SEND_BURST", 1)
+
+    start = time.monotonic()
+
+    sent = []
+
+    async def send_message(chat_id, text, **kwargs):
+        sent.append((chat_id, text, time.monotonic() - start))
+
+    # more than SEND_WORKERS messages to one chat,
+    # then one to another
+    jobs = [(1, f"m{i}") for i in range(20)] + [(2, "other")]
+
+    asyncio.run(deliver_all(jobs, send_message, monkeypatch))
+
+    assert [
+        text
+        for chat_id, text, _ in sent
+        if chat_id == 1
+    ] == [f"m{i}" for i in range(20)]
+
+    # 20 msg/s for chat 1 takes about a second
+    other = next(at for chat_id, _, at in sent if chat_id == 2)
+
+    assert other < 0.2
+
+    assert sent[-1][2] > 0.8
+
+    assert not sniper.chat_backlogs
+
+
+def test_flood_wait_pauses_global_bucket(monkeypatch):
+
+    calls = []
+
+    async def send_message(chat_id, text, **kwargs):
+
+        calls.append(chat_id)
+
+        if len(calls) == 1:
+
+            raise TelegramRetryAfter(
+                SendMessage(chat_id=chat_id, text=text),
+                "Flood control exceeded",
+                60
+            )
+
+    async def scenario():
+
+        await deliver_all([(1, "a")], send_message, monkeypatch)
+
+    async def check():
+
+        task = asyncio.create_task(scenario())
+
+        await asyncio.sleep(0.3)
+
+        # the retry waits on both buckets
+        assert calls == [1]
+
+        assert not sniper.global_bucket.try_acquire()
+
+        task.cancel()
+
+        await asyncio.gather(task, return_exceptions=True)
+
+        drains = list(sniper.chat_tasks)
+
+        for drain in drains:
+            drain.cancel()
+
+        await asyncio.gather(
+            *drains,
+            return_exceptions=True
+        )
+
+    asyncio.run(check())
+
+
+def test_shard_metrics_reach_coordinator(monkeypatch):
+
+    reports = queue.Queue()
+
+    monkeypatch.setattr(sniper, "shard_metrics", reports)
+
+    latency = sniper.send_latency.take()
+
+    errors = sniper.send_errors.take()
+
+    # what a delivery process records and reports
+    sniper.send_latency.observe(0.02)
+
+    sniper.send_errors.inc("TelegramNetworkError")
+
+    sniper.report_shard_metrics(reports)
+
+    assert sum(sniper.send_latency.counts) == 0
+
+    assert not sniper.send_errors.values
+
+    reports.put(None)
+
+    asyncio.run(sniper.collect_shard_metrics())
+
+    assert sum(sniper.send_latency.counts) == 1
+
+    assert sniper.send_errors.values == {
+        "TelegramNetworkError": 1
+    }
+
+    sniper.send_latency.take()
+
+    sniper.send_errors.take()
+
+    sniper.send_latency.merge(latency)
+
+    sniper.send_errors.merge(errors)
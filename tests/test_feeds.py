@@ -0,0 +1,39 @@
+# =========================================================
+# DISCOVERY FEEDS
+# =========================================================
+
+# Malformed feed entries are skipped, not allowed to
+# abort the scan.
+
+import asyncio
+import time
+
+import automated_sniper_bot as sniper
+
+
+def test_malformed_feed_items_skipped(monkeypatch):
+
+    async def api_get(session, url, decode=True):
+
+        return 200, [
+            {"chainId": "solana", "tokenAddress": "Good"},
+            "broken",
+            None,
+            ["solana", "Bad"],
+            {"chainId": "solana"}
+        ]
+
+    monkeypatch.setattr(sniper, "api_get", api_get)
+
+    profiles = asyncio.run(
+        sniper.fetch_feed(
+            None,
+            "feed",
+            time.monotonic() + 5
+        )
+    )
+
+    assert profiles == [
+        sniper.Profile("solana", "Good"),
+        sniper.Profile("solana", None)
+    ]
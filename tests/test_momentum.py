@@ -0,0 +1,58 @@
+# =========================================================
+# MOMENTUM ALERTS
+# =========================================================
+
+# A tracked token whose liquidity is pulled falls out
+# of the filters; its trackers must still be warned.
+
+import asyncio
+
+import automated_sniper_bot as sniper
+
+ADDRESS = "PulledPool111"
+
+
+def test_rejected_tracked_token_warns(monkeypatch, make_pairs):
+
+    queued = []
+
+    monkeypatch.setattr(
+        sniper,
+        "queue_message",
+        lambda chat_id, payload: queued.append(
+            (chat_id, payload.text)
+        )
+    )
+
+    monkeypatch.setattr(
+        sniper,
+        "filter_bounds",
+        sniper.DEFAULT_FILTER_BOUNDS
+    )
+
+    monkeypatch.setitem(sniper.trackers, ADDRESS, {7})
+
+    async def scan():
+
+        assert await sniper.resolve_token(
+            ADDRESS,
+            make_pairs(ADDRESS, liquidity=20000)
+        )
+
+        # below MIN_LIQUIDITY, so rejected
+        assert await sniper.resolve_token(
+            ADDRESS,
+            make_pairs(ADDRESS, liquidity=2000)
+        ) is None
+
+    asyncio.run(scan())
+
+    assert sniper.reject_cache.get(ADDRESS) == "liquidity"
+
+    assert len(queued) == 1
+
+    chat_id, text = queued[0]
+
+    assert chat_id == 7
+
+    assert text.startswith("🚨 Liquidity pulled")
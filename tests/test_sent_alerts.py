@@ -0,0 +1,46 @@
+# =========================================================
+# SENT ALERT DEDUP
+# =========================================================
+
+# Dedup rows that fail to save stay pending for the
+# next flush instead of being dropped.
+
+import asyncio
+
+import automated_sniper_bot as sniper
+
+
+def test_failed_rows_kept_for_next_flush(monkeypatch):
+
+    saved = []
+
+    fail = [True]
+
+    async def db_write(sql, params=()):
+
+        if sql != sniper.SAVE_SENT_ALERT_SQL:
+            return
+
+        if fail[0] and params[0] == "b":
+            raise RuntimeError("disk I/O error")
+
+        saved.append(params[0])
+
+    monkeypatch.setattr(sniper, "db_write", db_write)
+
+    for address in ("a", "b", "c"):
+        assert sniper.should_send_alert(address)
+
+    asyncio.run(sniper.flush_sent_alerts())
+
+    assert saved == ["a", "c"]
+
+    assert [row[0] for row in sniper.pending_alerts] == ["b"]
+
+    fail[0] = False
+
+    asyncio.run(sniper.flush_sent_alerts())
+
+    assert saved == ["a", "c", "b"]
+
+    assert not sniper.pending_alerts
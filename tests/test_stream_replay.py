@@ -0,0 +1,271 @@
+# =========================================================
+# STREAM REPLAY
+# =========================================================
+
+# Replays recorded pool creations through the local
+# stand-in server and checks streamed mints alert,
+# including one that is re-fetched once old enough.
+
+import asyncio
+import base64
+import json
+import logging
+import socket
+import struct
+
+from types import SimpleNamespace
+
+from aiohttp import web
+
+import automated_sniper_bot as sniper
+
+PUMP_MINT = bytes(range(1, 33))
+
+RAYDIUM_MINT = "RayMintReplay111"
+
+
+def free_port():
+
+    with socket.socket() as s:
+
+        s.bind(("127.0.0.1", 0))
+
+        return s.getsockname()[1]
+
+
+def borsh_string(value):
+
+    raw = value.encode()
+
+    return struct.pack("<I", len(raw)) + raw
+
+
+def replay_records():
+
+    event = (
+        sniper.PUMP_CREATE_EVENT
+        + borsh_string("Replay")
+        + borsh_string("RPL")
+        + borsh_string("https://u")
+        + PUMP_MINT
+        + bytes(64)
+    )
+
+    return [
+        {
+            "program": sniper.PUMP_FUN_PROGRAM,
+            "signature": "s1",
+            "logs": [
+                "Program log: Instruction: Create",
+                "Program data: "
+                + base64.b64encode(event).decode()
+            ]
+        },
+        {
+            "program": sniper.RAYDIUM_AMM_PROGRAM,
+            "signature": "s2",
+            "logs": ["Program log: initialize2"],
+            "transaction": {
+                "meta": {
+                    "postTokenBalances": [
+                        {"mint": sniper.WSOL_MINT},
+                        {"mint": RAYDIUM_MINT}
+                    ]
+                }
+            }
+        },
+        {
+            "program": sniper.RAYDIUM_AMM_PROGRAM,
+            "signature": "s3",
+            "err": {"InstructionError": [0, "Custom"]},
+            "logs": ["Program log: initialize2"],
+            "transaction": {
+                "meta": {
+                    "postTokenBalances": [
+                        {"mint": "FailedMint111"}
+                    ]
+                }
+            }
+        }
+    ]
+
+
+async def replay_scan(tmp_path, monkeypatch, make_pair):
+
+    path = tmp_path / "stream.jsonl"
+
+    path.write_text("\n".join(
+        json.dumps(record)
+        for record in replay_records()
+    ))
+
+    fetched = []
+
+    async def dex(request):
+
+        addresses = request.match_info["a"].split(",")
+
+        fetched.extend(addresses)
+
+        # the raydium pool is too young on its
+        # first fetch and old enough after that
+        return web.json_response([
+            make_pair(
+                address,
+                volume=90000,
+                price_change=300,
+                age_minutes=(
+                    3
+                    if address == RAYDIUM_MINT
+                    and fetched.count(address) == 1
+                    else 20
+                )
+            )
+            for address in addresses
+        ])
+
+    sent = []
+
+    async def send_message(chat_id, text, **kwargs):
+        sent.append((chat_id, text))
+
+    dex_app = web.Application()
+
+    dex_app.router.add_get(
+        "/tokens/v1/solana/{a}",
+        dex
+    )
+
+    dex_runner = web.AppRunner(dex_app)
+
+    await dex_runner.setup()
+
+    dex_port = free_port()
+
+    await web.TCPSite(
+        dex_runner,
+        "127.0.0.1",
+        dex_port
+    ).start()
+
+    replay_port = free_port()
+
+    monkeypatch.setattr(
+        sniper,
+        "DEX_URL",
+        f"http://127.0.0.1:{dex_port}/tokens/v1/solana/{{}}"
+    )
+
+    monkeypatch.setattr(
+        sniper,
+        "SOLANA_WS_URL",
+        f"http://127.0.0.1:{replay_port}/"
+    )
+
+    monkeypatch.setattr(
+        sniper,
+        "SOLANA_RPC_URL",
+        f"http://127.0.0.1:{replay_port}/"
+    )
+
+    monkeypatch.setattr(sniper, "DB_FILE", ":memory:")
+
+    monkeypatch.setattr(sniper, "STREAM_FLUSH_INTERVAL", 0.1)
+
+    # expire too_young rejections right away
+    monkeypatch.setattr(
+        sniper,
+        "reject_ttl",
+        lambda reason, age: 0.1
+    )
+
+    # cached pairs expire before the recheck,
+    # as they do with the real TTLs
+    monkeypatch.setattr(sniper.raw_cache, "ttl", 0.05)
+
+    monkeypatch.setattr(
+        sniper,
+        "bot",
+        SimpleNamespace(send_message=send_message)
+    )
+
+    await sniper.init_db()
+
+    await sniper.add_user(42)
+
+    await sniper.open_http_session()
+
+    replay = await sniper.start_replay_server(
+        str(path),
+        replay_port
+    )
+
+    tasks = [
+        asyncio.create_task(sniper.stream_discovery()),
+        asyncio.create_task(sniper.stream_loop())
+    ]
+
+    for stage in (
+        sniper.enrichment_stage,
+        sniper.scoring_stage,
+        sniper.delivery_stage
+    ):
+        tasks.extend(stage.start())
+
+    try:
+
+        for _ in range(60):
+
+            await asyncio.sleep(0.1)
+
+            if len(sent) >= 2:
+                break
+
+    finally:
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(
+            *tasks,
+            return_exceptions=True
+        )
+
+        await replay.cleanup()
+
+        await dex_runner.cleanup()
+
+        await sniper.close_http_session()
+
+        await sniper.close_db()
+
+    return fetched, sent
+
+
+def test_streamed_mints_alert(tmp_path, monkeypatch, make_pair):
+
+    logging.getLogger("aiohttp.access").setLevel(
+        logging.WARNING
+    )
+
+    fetched, sent = asyncio.run(
+        replay_scan(tmp_path, monkeypatch, make_pair)
+    )
+
+    pump_mint = sniper.b58encode(PUMP_MINT)
+
+    assert fetched.count(pump_mint) == 1
+
+    # failed transactions are never candidates
+    assert "FailedMint111" not in fetched
+
+    # re-fetched once the too_young rejection expired
+    assert fetched.count(RAYDIUM_MINT) == 2
+
+    assert len(sent) == 2
+
+    assert all(chat_id == 42 for chat_id, _ in sent)
+
+    assert any(pump_mint in text for _, text in sent)
+
+    assert any(RAYDIUM_MINT in text for _, text in sent)
@@ -0,0 +1,68 @@
+# =========================================================
+# USER FILTERS
+# =========================================================
+
+# Analysis must not reject tokens some user's own
+# thresholds would accept.
+
+import math
+
+import automated_sniper_bot as sniper
+
+
+def test_bounds_follow_loosest_user(monkeypatch):
+
+    users = [
+        sniper.UserFilter(1, 10000, 2000000, 5000),
+        sniper.UserFilter(2, 5000, 3000000, 20000),
+        sniper.UserFilter(3, 0, math.inf, 0)
+    ]
+
+    monkeypatch.setattr(
+        sniper,
+        "filter_bounds",
+        sniper.DEFAULT_FILTER_BOUNDS
+    )
+
+    sniper.set_filter_bounds(users[:2])
+
+    assert sniper.filter_bounds == (5000, 3000000, 5000)
+
+    sniper.set_filter_bounds(users)
+
+    assert sniper.filter_bounds == (0, math.inf, 0)
+
+    sniper.set_filter_bounds([])
+
+    assert (
+        sniper.filter_bounds
+        == sniper.DEFAULT_FILTER_BOUNDS
+    )
+
+
+def test_user_limit_below_default_alerts(monkeypatch, make_pairs):
+
+    # the default user min_liquidity is 5000, below
+    # MIN_LIQUIDITY
+    users = [
+        sniper.UserFilter(1, 10000, 2000000, 5000),
+        sniper.UserFilter(2, 10000, 2000000, 10000)
+    ]
+
+    monkeypatch.setattr(
+        sniper,
+        "filter_bounds",
+        sniper.DEFAULT_FILTER_BOUNDS
+    )
+
+    pairs = make_pairs("Loose", liquidity=6000)
+
+    assert sniper.evaluate_token(pairs)[1] == "liquidity"
+
+    sniper.set_filter_bounds(users)
+
+    token, reason, _ = sniper.evaluate_token(pairs)
+
+    assert reason is None
+
+    assert sniper.UserMatcher(users).match(token) == [1]